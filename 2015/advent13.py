@@ -1,24 +1,20 @@
-from itertools import islice, permutations
 import re
 
+from adventofcode.tsp import held_karp
 
-def circular_window(seq, n=2):
-    it = iter(seq + seq[:n - 1])
-    result = tuple(islice(it, n))
-    yield result
-    for elem in it:
-        result = result[1:] + (elem,)
-        yield result
 
-
-def calculate_happiness_change(graph, order):
-    return sum(graph[m][l] + graph[m][r]
-               for l, m, r in circular_window(order, 3))
+def best_seating(graph):
+    # the happiness change between two neighbours counts in both directions,
+    # so the seating is a closed tour over a symmetric matrix.
+    names = list(graph)
+    matrix = [[graph[a].get(b, 0) + graph[b].get(a, 0) for b in names]
+              for a in names]
+    change, order = held_karp(matrix, closed=True, maximise=True)
+    return change, tuple(names[i] for i in order)
 
 
 def find_max_happiness_change(graph):
-    return max(calculate_happiness_change(graph, o)
-               for o in permutations(graph))
+    return best_seating(graph)[0]
 
 
 def read_input(fileobj):
@@ -52,11 +48,10 @@ if __name__ == '__main__':
     if '--graph' in sys.argv:
         dirname, basename = os.path.split(filename)
         output = os.path.join(dirname, os.path.splitext(basename)[0] + '.dot')
-        order = max((o for o in permutations(graph)),
-                    key=lambda o: calculate_happiness_change(graph, o))
+        order = best_seating(graph)[1]
         with open(output, 'w') as df:
             df.write('graph advent_seating {\nlayout="circo";\n')
-            for name, toright in circular_window(order, 2):
+            for name, toright in zip(order, order[1:] + order[:1]):
                 df.write(
                     'n{0} [shape=circle, label="{0}", width=1]\n'
                     'n{0} -- n{1} '
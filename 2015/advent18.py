@@ -1,40 +1,31 @@
 from functools import reduce
-from itertools import chain, product
 
+from adventofcode.automaton import BitGrid
 
-def animate(lights):
-    new_state = []
-    for x, row in enumerate(lights):
-        new_state.append([])
-        for y, light in enumerate(row):
-            count = sum(
-                lights[x + dx][y + dy]
-                for dx, dy in product(range(-1, 2), repeat=2)
-                if (dx or dy) and
-                0 <= x + dx < len(lights) and 0 <= y + dy < len(row))
-            new_state[-1].append(count in {2, 3} if light else count == 3)
-    return new_state
 
+def animate(grid, lights):
+    return grid.life(lights)
 
-def animate_stuck(lights):
-    state = animate(lights)
-    state[0][0] = state[0][-1] = state[-1][0] = state[-1][-1] = True
-    return state
+
+def animate_stuck(grid, lights):
+    right, bottom = grid.width - 1, (grid.height - 1) * grid.stride
+    corners = 1 | 1 << right | 1 << bottom | 1 << bottom + right
+    return animate(grid, lights) | corners
 
 
 def read_display(fileobj):
-    return [[l == '#' for l in line.strip()] for line in fileobj]
+    lines = [line.strip() for line in fileobj if line.strip()]
+    grid = BitGrid(len(lines[0]), len(lines))
+    return grid, grid.pack_lines(lines)
 
 
 if __name__ == '__main__':
     import sys
     filename = sys.argv[-1]
     with open(filename) as f:
-        lights = read_display(f)
-    endstate = reduce(lambda l, i: animate(l), range(100), lights)
-    result = sum(chain.from_iterable(endstate))
-    print('Part 1:', result)
-
-    endstate = reduce(lambda l, i: animate_stuck(l), range(100), lights)
-    result = sum(chain.from_iterable(endstate))
-    print('Part 2:', result)
+        grid, lights = read_display(f)
+    endstate = reduce(lambda l, i: animate(grid, l), range(100), lights)
+    print('Part 1:', endstate.bit_count())
+
+    endstate = reduce(lambda l, i: animate_stuck(grid, l), range(100), lights)
+    print('Part 2:', endstate.bit_count())
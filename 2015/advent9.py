@@ -1,19 +1,21 @@
 # Travelling salesm^WSanta.
-# Just bruteforce it; it's only 7!
+# Bruteforcing works for a handful of locations, but Held-Karp scales better.
 import re
-from itertools import permutations
+from math import inf
+
+from adventofcode.tsp import held_karp
+
+
+def distance_matrix(g):
+    return [[0 if a == b else g[a].get(b, inf) for b in g] for a in g]
 
 
 def shortest(g):
-    return min(
-        sum(g[a][b] for a, b in zip(path, path[1:]))
-        for path in permutations(g))
+    return held_karp(distance_matrix(g))[0]
 
 
 def longest(g):
-    return max(
-        sum(g[a][b] for a, b in zip(path, path[1:]))
-        for path in permutations(g))
+    return held_karp(distance_matrix(g), maximise=True)[0]
 
 
 def read_graph(fileobj):
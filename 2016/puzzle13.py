@@ -1,28 +1,9 @@
 from collections import deque
-from heapq import heapify, heappush, heappop
-from itertools import count
+from operator import attrgetter
 
-DESIGNER_FAVOURITE = 1358
-
-
-class PriorityQueue:
-    def __init__(self, *initial):
-        self._queue = []
-        self._count = count()
-        for pri, item in initial:
-            self.put(pri, item)
-        heapify(self._queue)
-
-    def __len__(self):
-        return len(self._queue)
+from adventofcode.search import astar
 
-    def put(self, pri, item):
-        heappush(self._queue, (pri, next(self._count), item))
-
-    def get(self):
-        if not self:
-            raise ValueError('Queue is empty')
-        return heappop(self._queue)[-1]
+DESIGNER_FAVOURITE = 1358
 
 
 def is_open(x, y):
@@ -58,30 +39,10 @@ class MazeState:
 
 
 def shortest_path(start, goal):
-    queue = PriorityQueue((start.heuristic(goal), start))
-    open_ = {start: 0}
-    closed = set()
-
-    while open_:
-        current = queue.get()
-        if open_.get(current) != current.steps:
-            # ignore items in the queue for which a shorter
-            # path exists
-            continue
-
-        if current == goal:
-            return current.steps
-
-        del open_[current]
-        closed.add(current)
-        for neighbor in current.moves():
-            if neighbor in closed:
-                continue
-            if neighbor.steps >= open_.get(neighbor, float('inf')):
-                    # not a shorter path than we already have
-                    continue
-            open_[neighbor] = neighbor.steps
-            queue.put(neighbor.heuristic(goal), neighbor)
+    found = astar(
+        [start], goal.__eq__, MazeState.moves, attrgetter('steps'),
+        lambda state: state.heuristic(goal))
+    return found and found.steps
 
 
 def reachable(start, steps):
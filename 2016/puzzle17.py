@@ -1,27 +1,7 @@
 from collections import deque
 from hashlib import md5
-from heapq import heapify, heappush, heappop
-from itertools import count
 
-
-class PriorityQueue:
-    def __init__(self, *initial):
-        self._queue = []
-        self._count = count()
-        for pri, item in initial:
-            self.put(pri, item)
-        heapify(self._queue)
-
-    def __len__(self):
-        return len(self._queue)
-
-    def put(self, pri, item):
-        heappush(self._queue, (pri, next(self._count), item))
-
-    def get(self):
-        if not self:
-            raise ValueError('Queue is empty')
-        return heappop(self._queue)[-1]
+from adventofcode.search import astar
 
 
 DIR = {
@@ -62,20 +42,10 @@ class MazeState:
 
 
 def shortest_path(start):
-    queue = PriorityQueue((start.heuristic(), start))
-    closed = set()
-
-    while queue:
-        current = queue.get()
-
-        if (current.x, current.y) == (3, 3):
-            return current.path
-
-        closed.add(current)
-        for neighbor in current.moves():
-            if neighbor in closed:
-                continue
-            queue.put(neighbor.heuristic(), neighbor)
+    found = astar(
+        [start], lambda state: (state.x, state.y) == (3, 3), MazeState.moves,
+        lambda state: len(state.path), MazeState.heuristic)
+    return found and found.path
 
 
 def longest_path(start):
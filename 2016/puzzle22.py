@@ -2,32 +2,13 @@ import os.path
 
 from bisect import bisect_left
 from collections import namedtuple
-from heapq import heapify, heappush, heappop
-from itertools import count, islice
+from itertools import islice
 from operator import attrgetter
 
+from adventofcode.search import astar
 
-HERE = os.path.dirname(os.path.abspath(__file__))
-
-
-class PriorityQueue:
-    def __init__(self, *initial):
-        self._queue = []
-        self._count = count()
-        for pri, item in initial:
-            self.put(pri, item)
-        heapify(self._queue)
-
-    def __len__(self):
-        return len(self._queue)
-
-    def put(self, pri, item):
-        heappush(self._queue, (pri, next(self._count), item))
 
-    def get(self):
-        if not self:
-            raise ValueError('Queue is empty')
-        return heappop(self._queue)[-1]
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 
 class Server(namedtuple('ServerBase', 'x y size used available perc')):
@@ -76,30 +57,10 @@ class State:
 
 
 def shortest_path(start, goal):
-    queue = PriorityQueue((start.heuristic(goal), start))
-    open_ = {start: 0}
-    closed = set()
-
-    while open_:
-        current = queue.get()
-        if open_.get(current) != current.steps:
-            # ignore items in the queue for which a shorter
-            # path exists
-            continue
-
-        if current.focus == (goal.x, goal.y):
-            return current.steps
-
-        del open_[current]
-        closed.add(current)
-        for neighbor in current.moves():
-            if neighbor in closed:
-                continue
-            if neighbor.steps >= open_.get(neighbor, float('inf')):
-                    # not a shorter path than we already have
-                    continue
-            open_[neighbor] = neighbor.steps
-            queue.put(neighbor.heuristic(goal), neighbor)
+    found = astar(
+        [start], lambda state: state.focus == (goal.x, goal.y), State.moves,
+        attrgetter('steps'), lambda state: state.heuristic(goal))
+    return found and found.steps
 
 
 def free_data(servers):
@@ -1,29 +1,52 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import operator
+import os
+import shelve
+import tempfile
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from dataclasses import dataclass, field
 from enum import Enum
 from functools import partial
-from operator import getitem, setitem
+from io import BytesIO
+from itertools import permutations, product
+from operator import getitem, itemgetter, setitem
 from typing import (
+    IO,
     TYPE_CHECKING,
     Any,
     Callable,
+    Deque,
     Dict,
+    Generator,
     Iterable,
+    Iterator,
     List,
     Mapping,
     Optional,
     Protocol,
+    Sequence,
+    Set,
     Tuple,
+    Type,
     TypeVar,
     Union,
     cast,
     overload,
 )
 
+import numpy as np
+import numpy.typing as npt
+
 T = TypeVar("T", bound="CPU")
+C = TypeVar("C")
+R = TypeVar("R")
 Registers = Dict[str, int]
 
 
@@ -35,10 +58,65 @@ class Halt(Exception):
         raise cls
 
 
-class Memory(List[int]):
-    def _grow(self, target: int) -> None:
-        assert target + 1 < 2**16, f"Asking for too much memory: {target}"
-        self.extend([0] * (target + 1 - len(self)))
+# memory is allocated in pages of 2 ** PAGE_BITS cells
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+Page = Union["array[int]", List[int]]
+
+
+def _page(values: Iterable[int] = ()) -> Page:
+    """Create a page of 64-bit cells, or Python ints if the values don't fit"""
+    values = list(values)
+    values += [0] * (PAGE_SIZE - len(values))
+    try:
+        return array("q", values)
+    except OverflowError:
+        return values
+
+
+class Memory:
+    """Sparse Intcode memory, addressable without upper bound
+
+    Memory is stored in pages of signed 64-bit integers, allocated on the first
+    write to an address in that page. Reading from an unallocated page produces
+    0 without allocating anything. A page that has to hold a value that doesn't
+    fit in 64 bits is converted to a list of Python integers.
+
+    """
+
+    __slots__ = ("_pages", "_size", "_shared")
+
+    _pages: Dict[int, Page]
+    # one past the highest address loaded or written
+    _size: int
+    # page numbers shared with copies of this memory, copied before writing
+    _shared: Set[int]
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        values = list(values)
+        self._pages = {
+            n: _page(values[offset : offset + PAGE_SIZE])
+            for n, offset in enumerate(range(0, len(values), PAGE_SIZE))
+        }
+        self._size = len(values)
+        self._shared = set()
+
+    def copy(self) -> Memory:
+        """Produce a copy that shares all pages until either side writes to them"""
+        clone = Memory.__new__(Memory)
+        clone._pages, clone._size = dict(self._pages), self._size
+        self._shared, clone._shared = set(self._pages), set(self._pages)
+        return clone
+
+    def __repr__(self) -> str:
+        return f"<Memory: {len(self._pages)} pages, size {self._size}>"
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[int]:
+        return map(self.__getitem__, range(self._size))
 
     @overload
     def __getitem__(self, i: int) -> int:
@@ -48,13 +126,13 @@ class Memory(List[int]):
     def __getitem__(self, i: slice) -> List[int]:
         ...
 
-    def __getitem__(self, i):  # pyright: ignore[reportIncompatibleMethodOverride]
-        try:
-            return super().__getitem__(i)
-        except IndexError:
-            if isinstance(i, int):
-                self._grow(i)
-            return super().__getitem__(i)
+    def __getitem__(self, i: Union[int, slice]) -> Union[int, List[int]]:
+        if isinstance(i, slice):
+            return [self[a] for a in range(*i.indices(self._size))]
+        if i < 0:
+            raise IndexError(f"Negative memory address: {i}")
+        page = self._pages.get(i >> PAGE_BITS)
+        return 0 if page is None else page[i & PAGE_MASK]
 
     @overload
     def __setitem__(self, i: int, o: int) -> None:
@@ -64,13 +142,29 @@ class Memory(List[int]):
     def __setitem__(self, i: slice, o: Iterable[int]) -> None:
         ...
 
-    def __setitem__(self, i, o) -> None:  # pyright: ignore[reportIncompatibleMethodOverride]
+    def __setitem__(self, i: Union[int, slice], o: Union[int, Iterable[int]]) -> None:
+        if isinstance(i, slice):
+            assert not isinstance(o, int)
+            for addr, value in zip(range(*i.indices(self._size)), o, strict=True):
+                self[addr] = value
+            return
+        assert isinstance(o, int)
+        if i < 0:
+            raise IndexError(f"Negative memory address: {i}")
+        pages, n = self._pages, i >> PAGE_BITS
+        page = pages.get(n)
+        if page is None:
+            page = pages[n] = _page()
+        elif n in self._shared:
+            page = pages[n] = page[:]
+            self._shared.discard(n)
         try:
-            super().__setitem__(i, o)
-        except IndexError:
-            if isinstance(i, int):
-                self._grow(i)
-            super().__setitem__(i, o)
+            page[i & PAGE_MASK] = o
+        except OverflowError:
+            page = pages[n] = list(page)
+            page[i & PAGE_MASK] = o
+        if i >= self._size:
+            self._size = i + 1
 
 
 class _ParameterGetter(Protocol):
@@ -122,6 +216,45 @@ class ParameterMode(Enum):
         mode.set = setter
         return mode
 
+    def reader(self, param: int, cpu: CPU) -> Callable[[], int]:
+        """Produce a callable that reads the value for a parameter in this mode"""
+        if self is ParameterMode.immediate:
+            return lambda: param
+        mem = cpu.memory
+        if self is ParameterMode.position:
+            return partial(getitem, mem, param)
+        registers = cpu.registers
+        return lambda: mem[param + registers["relative base"]]
+
+    def writer(self, param: int, cpu: CPU) -> Callable[[int], None]:
+        """Produce a callable that writes a value for a parameter in this mode
+
+        Writes to addresses that hold decoded instructions invalidate those
+        instructions in the CPU decode cache.
+
+        """
+        if self is ParameterMode.immediate:
+            return lambda value: Halt.halt()
+        mem, covered, invalidate = cpu.memory, cpu._covered, cpu._invalidate
+        if self is ParameterMode.position:
+
+            def write(value: int) -> None:
+                mem[param] = value
+                if param in covered:
+                    invalidate(param)
+
+            return write
+
+        registers = cpu.registers
+
+        def write_relative(value: int) -> None:
+            target = param + registers["relative base"]
+            mem[target] = value
+            if target in covered:
+                invalidate(target)
+
+        return write_relative
+
 
 @dataclass
 class _InstructionBaseFields:
@@ -130,6 +263,9 @@ class _InstructionBaseFields:
     output: bool = False
 
 
+Step = Callable[[], int]
+
+
 class InstructionBase(ABC, _InstructionBaseFields):
     @abstractmethod
     def __call__(
@@ -138,6 +274,11 @@ class InstructionBase(ABC, _InstructionBaseFields):
         """Produce a new CPU position and a result"""
         raise NotImplementedError()
 
+    @property
+    def length(self) -> int:
+        """Number of memory cells taken up by the opcode and its parameters"""
+        return 1 + self.arg_count + int(self.output)
+
     def bind(self, opcode: int, cpu: CPU) -> BoundInstruction:
         # assumption: on binding, cpu.pos points to the position in memory
         # for our opcode.
@@ -150,6 +291,39 @@ class InstructionBase(ABC, _InstructionBaseFields):
             cpu,
         )
 
+    def operands(
+        self, opcode: int, cpu: CPU
+    ) -> Tuple[List[Callable[[], int]], Optional[Callable[[int], None]]]:
+        """Resolve parameter modes into argument readers and an output writer"""
+        bound = self.bind(opcode, cpu)
+        mem, offset = cpu.memory, bound.offset
+        readers = [
+            mode.reader(mem[i], cpu)
+            for i, mode in enumerate(bound.modes[: self.arg_count], start=offset)
+        ]
+        writer = None
+        if self.output:
+            writer = bound.modes[-1].writer(mem[offset + self.arg_count], cpu)
+        return readers, writer
+
+    def decode(self, opcode: int, cpu: CPU) -> Step:
+        """Produce a step function for the instruction at cpu.pos
+
+        The step function executes the instruction, with parameter modes and
+        addresses already resolved, and returns the new CPU position.
+
+        """
+        readers, writer = self.operands(opcode, cpu)
+        pos, registers = cpu.pos, cpu.registers
+
+        def step() -> int:
+            newpos, result = self(pos, *[r() for r in readers], registers=registers)
+            if writer is not None:
+                writer(int(result))
+            return newpos
+
+        return step
+
 
 @dataclass
 class CallableInstructionBase:
@@ -171,6 +345,18 @@ class AdjustRelativeBaseInstruction(InstructionBase):
         registers["relative base"] += args[0]
         return pos + 1 + self.arg_count + int(self.output), None
 
+    def decode(self, opcode: int, cpu: CPU) -> Step:
+        if type(self).__call__ is not AdjustRelativeBaseInstruction.__call__:
+            return super().decode(opcode, cpu)
+        (adjustment,), _ = self.operands(opcode, cpu)
+        registers, nextpos = cpu.registers, cpu.pos + self.length
+
+        def step() -> int:
+            registers["relative base"] += adjustment()
+            return nextpos
+
+        return step
+
 
 @dataclass
 class Instruction(InstructionBase, CallableInstructionBase):
@@ -179,6 +365,53 @@ class Instruction(InstructionBase, CallableInstructionBase):
         pos += 1 + self.arg_count + int(self.output)
         return pos, self.f(*args)
 
+    def decode(self, opcode: int, cpu: CPU) -> Step:
+        if type(self).__call__ is not Instruction.__call__:
+            return super().decode(opcode, cpu)
+        readers, writer = self.operands(opcode, cpu)
+        f, nextpos = self.f, cpu.pos + self.length
+        # specialise the common cases, avoiding argument list building.
+        match readers, writer:
+            case [[a, b], None]:
+
+                def step() -> int:
+                    f(a(), b())
+                    return nextpos
+
+            case [[a, b], write] if write is not None:
+
+                def step() -> int:
+                    write(int(f(a(), b())))
+                    return nextpos
+
+            case [[a], None]:
+
+                def step() -> int:
+                    f(a())
+                    return nextpos
+
+            case [[], None]:
+
+                def step() -> int:
+                    f()
+                    return nextpos
+
+            case [[], write] if write is not None:
+
+                def step() -> int:
+                    write(int(f()))
+                    return nextpos
+
+            case _:
+
+                def step() -> int:
+                    result = f(*[r() for r in readers])
+                    if writer is not None:
+                        writer(int(result))
+                    return nextpos
+
+        return step
+
 
 class JumpInstruction(Instruction):
     def __call__(self, pos: int, *args: int, **kwargs: Any) -> Tuple[int, Any]:
@@ -187,6 +420,17 @@ class JumpInstruction(Instruction):
         pos, result = super().__call__(pos, *jmpargs)
         return jump_to if result else pos, result
 
+    def decode(self, opcode: int, cpu: CPU) -> Step:
+        if type(self).__call__ is not JumpInstruction.__call__ or self.arg_count != 2:
+            return InstructionBase.decode(self, opcode, cpu)
+        (test, jump_to), _ = self.operands(opcode, cpu)
+        f, nextpos = self.f, cpu.pos + self.length
+
+        def step() -> int:
+            return jump_to() if f(test()) else nextpos
+
+        return step
+
 
 @dataclass
 class BoundInstruction:
@@ -218,14 +462,205 @@ class BoundInstruction:
 InstructionSet = Mapping[int, InstructionBase]
 
 
+@dataclass
+class Profile:
+    """Execution statistics, collected by a CPU with profiling enabled"""
+
+    # executions per opcode (without parameter modes)
+    opcodes: Counter[int] = field(default_factory=Counter)
+    # executions per instruction address
+    addresses: Counter[int] = field(default_factory=Counter)
+    # backward jumps taken, per (jump address, target address) pair
+    jumps: Counter[Tuple[int, int]] = field(default_factory=Counter)
+
+    def loops(self, top: int = 10) -> List[Dict[str, int]]:
+        """The loops that took up the most steps, largest first
+
+        A loop is the code between the target and the address of a backward
+        jump; its steps are all executions of instructions in that range.
+
+        """
+        addresses = self.addresses
+        loops = [
+            {
+                "start": target,
+                "end": source,
+                "iterations": iterations,
+                "steps": sum(addresses[addr] for addr in range(target, source + 1)),
+            }
+            for (source, target), iterations in self.jumps.items()
+        ]
+        return sorted(loops, key=itemgetter("steps"), reverse=True)[:top]
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        """Summarise the profile as a JSON-compatible structure"""
+        return {
+            "steps": self.opcodes.total(),
+            "opcodes": dict(sorted(self.opcodes.items())),
+            "inputs": self.opcodes[3],
+            "outputs": self.opcodes[4],
+            "addresses": dict(sorted(self.addresses.items())),
+            "loops": self.loops(top),
+        }
+
+    def dump(self, fp: IO[str], top: int = 10) -> None:
+        """Write the profile report to a file as JSON"""
+        json.dump(self.report(top), fp, indent=2)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """CPU state captured at a specific point in its execution"""
+
+    memory: Memory
+    pos: int
+    registers: Registers
+
+
+def _encode_varints(out: bytearray, *values: int) -> None:
+    # LEB128, with signed values zigzag-encoded so small negative values stay small
+    for value in values:
+        value = value * 2 if value >= 0 else -value * 2 - 1
+        while value > 0x7F:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def _decode_varints(data: bytes) -> Iterator[int]:
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield value // 2 if not value & 1 else -(value + 1) // 2
+            value = shift = 0
+
+
+@dataclass
+class Trace:
+    """Input and output of a program run, recorded for deterministic replay
+
+    Each event is a (step, kind, value) tuple, where kind is Trace.INPUT or
+    Trace.OUTPUT and step counts the instructions executed up to and including
+    the input or output instruction.
+
+    """
+
+    INPUT, OUTPUT = 0, 1
+    _MAGIC = b"ICT\x01"
+
+    start: Snapshot
+    events: List[Tuple[int, int, int]] = field(default_factory=list)
+    # total number of instructions executed
+    steps: int = 0
+
+    @property
+    def inputs(self) -> List[int]:
+        return [value for _, kind, value in self.events if kind == Trace.INPUT]
+
+    @property
+    def outputs(self) -> List[int]:
+        return [value for _, kind, value in self.events if kind == Trace.OUTPUT]
+
+    def dump(self, fp: IO[bytes]) -> None:
+        """Write the trace to a binary file
+
+        All values, including the initial memory, are stored as variable-length
+        integers; event steps are stored as the delta from the preceding event.
+
+        """
+        start, out = self.start, bytearray(Trace._MAGIC)
+        _encode_varints(out, start.pos, start.registers["relative base"])
+        _encode_varints(out, len(start.memory), *start.memory)
+        _encode_varints(out, self.steps, len(self.events))
+        last = 0
+        for step, kind, value in self.events:
+            _encode_varints(out, (step - last) * 2 + kind, value)
+            last = step
+        fp.write(out)
+
+    @classmethod
+    def load(cls, fp: IO[bytes]) -> Trace:
+        """Read a trace previously written with Trace.dump()"""
+        data = fp.read()
+        if data[: len(cls._MAGIC)] != cls._MAGIC:
+            raise ValueError("Not an Intcode trace file")
+        values = _decode_varints(data[len(cls._MAGIC) :])
+        pos, relative_base, size = next(values), next(values), next(values)
+        memory = Memory([next(values) for _ in range(size)])
+        trace = cls(Snapshot(memory, pos, {"relative base": relative_base}))
+        trace.steps, count, step = next(values), next(values), 0
+        for _ in range(count):
+            delta, kind = divmod(next(values), 2)
+            step += delta
+            trace.events.append((step, kind, next(values)))
+        return trace
+
+    def replay(
+        self, cpu_type: Optional[Type[CPU]] = None, check_steps: bool = False
+    ) -> CPU:
+        """Run the program again, feeding it the recorded input
+
+        Raises ValueError if the program output differs from the recorded
+        output. With check_steps set, the CPU profiles execution so the step
+        count of each event is verified too; leave it unset to time optimised
+        execution.
+
+        """
+        expected = deque(self.events)
+        cpu = (cpu_type or CPU)(base_opcodes)
+        steps: Optional[Callable[[], int]] = None
+
+        def take(kind: int, value: Optional[int] = None) -> int:
+            if not expected or expected[0][1] != kind:
+                raise ValueError(f"Unexpected {('input', 'output')[kind]} request")
+            step, _, recorded = expected.popleft()
+            if value is not None and value != recorded:
+                raise ValueError(f"Output {value} differs from recorded {recorded}")
+            if steps is not None and (actual := steps()) != step:
+                raise ValueError(f"Event at step {actual}, recorded at {step}")
+            return recorded
+
+        cpu.opcodes = {
+            **base_opcodes,
+            3: Instruction(partial(take, Trace.INPUT), output=True),
+            4: Instruction(partial(take, Trace.OUTPUT), 1),
+        }
+        cpu.restore(self.start)
+        if check_steps:
+            steps = cpu.start_profiling().opcodes.total
+        cpu.execute()
+        if expected:
+            raise ValueError(f"Program halted with {len(expected)} events remaining")
+        if steps is not None and (actual := steps()) != self.steps:
+            raise ValueError(f"Program halted at step {actual}, recorded {self.steps}")
+        return cpu
+
+
 class CPU:
     memory: Memory
     pos: int
     opcodes: InstructionSet
     registers: Registers
+    # execution statistics, only collected when profiling is enabled
+    profile: Optional[Profile] = None
+    # collapse simple counted loops into arithmetic
+    fuse_loops: bool = True
+    # input and output trace, only collected when recording is enabled
+    trace: Optional[Trace] = None
+    # decoded instruction cache; maps addresses to opcode word and step function
+    _decoded: Dict[int, Tuple[int, Step]]
+    # maps memory addresses to the addresses of decoded instructions covering them
+    _covered: Dict[int, Set[int]]
+    # restores the instruction set and profiling state when recording stops
+    _stop_recording: Callable[[], None]
+    # counts the steps executed since recording started
+    _recorded_steps: Callable[[], int]
 
     def __init__(self, opcodes: InstructionSet) -> None:
         self.opcodes = opcodes
+        self._decoded, self._covered = {}, {}
 
     def __getitem__(self, opcode: int) -> BoundInstruction:
         return self.opcodes[opcode % 100].bind(opcode, self)
@@ -233,19 +668,569 @@ class CPU:
     def reset(self: T, memory: Optional[Union[List, Memory]] = None) -> T:
         if memory is None:
             memory = Memory()
-        self.memory = Memory(memory)
-        self.pos: int = 0
-        self.registers = {"relative base": 0}
+        self._load(Memory(memory), 0, {"relative base": 0})
+        return self  # allow chaining
+
+    def _load(self, memory: Memory, pos: int, registers: Registers) -> None:
+        self.memory = memory
+        self.pos: int = pos
+        self.registers = registers
+        self._decoded, self._covered = {}, {}
+
+    def snapshot(self) -> Snapshot:
+        """Capture the current state; memory pages are shared copy-on-write"""
+        return Snapshot(self.memory.copy(), self.pos, dict(self.registers))
+
+    def restore(self: T, snapshot: Snapshot) -> T:
+        """Continue from a previously captured state"""
+        self._load(snapshot.memory.copy(), snapshot.pos, dict(snapshot.registers))
         return self  # allow chaining
 
+    def fork(self: T, opcodes: Optional[InstructionSet] = None) -> T:
+        """Create a new CPU that continues independently from the current state
+
+        Pass in a new instruction set to give the fork its own I/O hooks.
+
+        """
+        forked = copy(self)
+        if opcodes is not None:
+            forked.opcodes = opcodes
+        return forked.restore(self.snapshot())
+
+    def _decode(self, opcode: int) -> Step:
+        """Decode the code at the current position and cache the result"""
+        fused = self._fuse_loop(opcode)
+        if fused is not None:
+            return fused
+        return self._decode_instruction(opcode)
+
+    def _decode_instruction(self, opcode: int) -> Step:
+        """Decode the instruction at the current position and cache the result"""
+        instr = self.opcodes[opcode % 100]
+        step = instr.decode(opcode, self)
+        self._cache(opcode, step, self.pos + instr.length)
+        return step
+
+    def _fuse_loop(self, opcode: int) -> Optional[Step]:
+        """Collapse a counted loop starting at the current position into arithmetic
+
+        The loop body must consist of base opcode additions that each add a
+        loop-invariant value to their own output (accumulators), optionally a
+        single comparison of one of those accumulators (the counter, stepping
+        by 1 or -1) with a loop-invariant value, and a final conditional jump
+        back to the start of the loop, testing the comparison result or the
+        counter directly. Only position and immediate modes are supported.
+
+        The step function calculates the number of iterations from the initial
+        counter value, and updates all outputs in one go. Writes to the code of
+        the loop invalidate the step function like any other decoded code.
+
+        """
+        if not self.fuse_loops:
+            return None
+        mem, start, opcodes = self.memory, self.pos, self.opcodes
+        body: List[Tuple[int, List[int], List[int]]] = []
+        pos = start
+        for _ in range(_MAX_LOOP_BODY):
+            word = mem[pos]
+            code, instr = word % 100, opcodes.get(word % 100)
+            if instr is None or base_opcodes.get(code) is not instr:
+                return None
+            if code not in (1, 5, 6, 7, 8) or word // 10 ** (instr.length + 1):
+                return None
+            modes = [word // 10 ** (i + 2) % 10 for i in range(instr.length - 1)]
+            if not set(modes) <= {0, 1}:
+                return None
+            body.append((code, modes, [mem[a] for a in range(pos + 1, pos + 4)]))
+            pos += instr.length
+            if code in (5, 6):
+                break
+        else:
+            return None
+        end = pos
+        jump, jump_modes, (test, target, _) = body.pop()
+        if jump_modes != [0, 1] or target != start:
+            return None
+
+        # accumulator addresses, mapped to the mode and parameter added each time
+        accumulators: Dict[int, Tuple[int, int]] = {}
+        # the order in which outputs are written in the loop body
+        order: Dict[int, int] = {}
+        comparison: Optional[List[int]] = None
+        for i, (code, modes, params) in enumerate(body):
+            output = params[2]
+            if modes[2] != 0 or output in order:
+                return None
+            order[output] = i
+            if code != 1:
+                if comparison is not None:
+                    return None
+                comparison = [code, *modes[:2], *params]
+                continue
+            a, b = zip(modes[:2], params[:2])
+            if a == (0, output):
+                accumulators[output] = b
+            elif b == (0, output):
+                accumulators[output] = a
+            else:
+                return None
+
+        # the loop continues while `counter <relation> value` holds
+        if comparison is None:
+            if jump != 5 or test not in accumulators:
+                return None
+            counter, relation, value = test, "!=", (1, 0)
+        else:
+            code, mode_x, mode_y, x, y, flag = comparison
+            if test != flag:
+                return None
+            if mode_x == 0 and x in accumulators:
+                counter, value = x, (mode_y, y)
+                relation = "<" if code == 7 else "=="
+            elif mode_y == 0 and y in accumulators:
+                counter, value = y, (mode_x, x)
+                relation = ">" if code == 7 else "=="
+            else:
+                return None
+            if jump == 6:
+                relation = _negated_relations[relation]
+            if order[counter] > order[flag]:
+                # the comparison must test the updated counter
+                return None
+
+        step_mode, step_size = accumulators[counter]
+        sources = [addr for mode, addr in [*accumulators.values(), value] if mode == 0]
+        if (
+            (step_mode, abs(step_size)) != (1, 1)
+            or any(start <= addr < end for addr in order)
+            or any(addr in order for addr in sources)
+        ):
+            return None
+
+        position, immediate = ParameterMode.position, ParameterMode.immediate
+        modes = [position, immediate]
+        fallback = opcodes[opcode % 100].decode(opcode, self)
+        read_counter = position.reader(counter, self)
+        read_value = modes[value[0]].reader(value[1], self)
+        updates = [
+            (
+                position.reader(addr, self),
+                modes[mode].reader(param, self),
+                position.writer(addr, self),
+            )
+            for addr, (mode, param) in accumulators.items()
+        ]
+        write_flag = None
+        if comparison is not None:
+            write_flag = position.writer(comparison[-1], self)
+        # the flag ends up false for jump-if-true, and true for jump-if-false
+        flag_result = int(jump == 6)
+
+        def step() -> int:
+            n = _loop_iterations(read_counter(), step_size, relation, read_value())
+            if n is None:
+                return fallback()
+            results = [read() + n * increment() for read, increment, _ in updates]
+            for (*_, write), result in zip(updates, results):
+                write(result)
+            if write_flag is not None:
+                write_flag(flag_result)
+            return end
+
+        self._cache(opcode, step, end)
+        return step
+
+    def _cache(self, opcode: int, step: Step, end: int) -> None:
+        """Cache a step function for the code from the current position to end"""
+        pos, covered = self.pos, self._covered
+        self._decoded[pos] = opcode, step
+        for addr in range(pos, end):
+            covered.setdefault(addr, set()).add(pos)
+
+    def _invalidate(self, addr: int) -> None:
+        """Drop decoded instructions that cover a memory address"""
+        decoded = self._decoded
+        for pos in self._covered.pop(addr, ()):
+            decoded.pop(pos, None)
+
+    def start_profiling(self) -> Profile:
+        """Collect execution statistics for subsequent calls to execute() or run()"""
+        self.profile = Profile()
+        # statistics are collected per instruction, never per compiled block
+        self._decoded.clear()
+        self._covered.clear()
+        return self.profile
+
+    def stop_profiling(self) -> Optional[Profile]:
+        """Stop collecting execution statistics, producing those collected"""
+        profile, self.profile = self.profile, None
+        return profile
+
+    def start_recording(self) -> Trace:
+        """Record input and output for subsequent calls to execute() or run()
+
+        The trace starts from the current state. Recording enables profiling
+        to count steps, and wraps the input and output instructions of the
+        instruction set; stop_recording() restores both.
+
+        """
+        profiled = self.profile is not None
+        profile = self.profile or self.start_profiling()
+        base = profile.opcodes.total()
+        trace = self.trace = Trace(self.snapshot())
+        opcodes, read, write = self.opcodes, self.opcodes[3], self.opcodes[4]
+        assert isinstance(read, Instruction) and isinstance(write, Instruction)
+
+        def steps() -> int:
+            return profile.opcodes.total() - base
+
+        def record_input() -> int:
+            value = read.f()
+            trace.events.append((steps(), Trace.INPUT, value))
+            return value
+
+        def record_output(value: int) -> Any:
+            trace.events.append((steps(), Trace.OUTPUT, value))
+            return write.f(value)
+
+        def stop() -> None:
+            trace.steps = steps()
+            self.opcodes = opcodes
+            if not profiled:
+                self.stop_profiling()
+
+        self._stop_recording, self._recorded_steps = stop, steps
+        self.opcodes = {
+            **opcodes,
+            3: Instruction(record_input, output=True),
+            4: Instruction(record_output, 1),
+        }
+        self._decoded.clear()
+        self._covered.clear()
+        return trace
+
+    def stop_recording(self) -> Optional[Trace]:
+        """Stop recording input and output, producing the trace recorded"""
+        trace, self.trace = self.trace, None
+        if trace is not None:
+            self._stop_recording()
+            self._decoded.clear()
+            self._covered.clear()
+        return trace
+
     def execute(self) -> None:
-        mem = self.memory
+        if self.profile is not None:
+            return self._execute_profiled(self.profile)
+        mem, decoded, pos = self.memory, self._decoded, self.pos
         try:
             while True:
-                self.pos = self[mem[self.pos]]()
+                opcode = mem[pos]
+                cached = decoded.get(pos)
+                if cached is not None and cached[0] == opcode:
+                    self.pos = pos = cached[1]()
+                else:
+                    self.pos = pos = self._decode(opcode)()
         except Halt:
             return
 
+    def _execute_profiled(self, profile: Profile) -> None:
+        mem, decoded, pos = self.memory, self._decoded, self.pos
+        opcodes, addresses, jumps = profile.opcodes, profile.addresses, profile.jumps
+        try:
+            while True:
+                opcode = mem[pos]
+                cached = decoded.get(pos)
+                if cached is None or cached[0] != opcode:
+                    cached = opcode, CPU._decode_instruction(self, opcode)
+                opcodes[opcode % 100] += 1
+                addresses[pos] += 1
+                self.pos = newpos = cached[1]()
+                if newpos <= pos:
+                    jumps[pos, newpos] += 1
+                pos = newpos
+        except Halt:
+            return
+
+    def run(self) -> Generator[Optional[int], Optional[int], None]:
+        """Execute as a generator, pausing for input and output
+
+        Output values are yielded as they are produced. When the program needs
+        input, None is yielded; send the input value to resume. The generator
+        is exhausted when the program halts. The input and output instructions
+        of the instruction set are not used in this mode. Profiling and
+        recording apply if they are enabled when the generator starts.
+
+        """
+        if self.profile is not None:
+            return (yield from self._run_profiled(self.profile))
+        mem, decoded, pos = self.memory, self._decoded, self.pos
+        try:
+            while True:
+                opcode = mem[pos]
+                if opcode % 100 == 3:
+                    _, writer = base_opcodes[3].operands(opcode, self)
+                    assert writer is not None
+                    while (value := (yield None)) is None:
+                        pass
+                    writer(value)
+                    self.pos = pos = pos + base_opcodes[3].length
+                    continue
+                if opcode % 100 == 4:
+                    (reader,), _ = base_opcodes[4].operands(opcode, self)
+                    self.pos = pos = pos + base_opcodes[4].length
+                    yield reader()
+                    continue
+                cached = decoded.get(pos)
+                if cached is not None and cached[0] == opcode:
+                    self.pos = pos = cached[1]()
+                else:
+                    self.pos = pos = self._decode(opcode)()
+        except Halt:
+            return
+
+    def _run_profiled(
+        self, profile: Profile
+    ) -> Generator[Optional[int], Optional[int], None]:
+        mem, decoded, pos = self.memory, self._decoded, self.pos
+        opcodes, addresses, jumps = profile.opcodes, profile.addresses, profile.jumps
+        read, write = base_opcodes[3], base_opcodes[4]
+        trace = self.trace
+        try:
+            while True:
+                opcode = mem[pos]
+                opcodes[opcode % 100] += 1
+                addresses[pos] += 1
+                if opcode % 100 == 3:
+                    _, writer = read.operands(opcode, self)
+                    assert writer is not None
+                    while (value := (yield None)) is None:
+                        pass
+                    if trace is not None:
+                        step = self._recorded_steps()
+                        trace.events.append((step, Trace.INPUT, value))
+                    writer(value)
+                    self.pos = pos = pos + read.length
+                    continue
+                if opcode % 100 == 4:
+                    (reader,), _ = write.operands(opcode, self)
+                    self.pos = pos = pos + write.length
+                    value = reader()
+                    if trace is not None:
+                        step = self._recorded_steps()
+                        trace.events.append((step, Trace.OUTPUT, value))
+                    yield value
+                    continue
+                cached = decoded.get(pos)
+                if cached is None or cached[0] != opcode:
+                    cached = opcode, CPU._decode_instruction(self, opcode)
+                self.pos = newpos = cached[1]()
+                if newpos <= pos:
+                    jumps[pos, newpos] += 1
+                pos = newpos
+        except Halt:
+            return
+
+
+# longest loop body, in instructions, that CPU._fuse_loop() will consider
+_MAX_LOOP_BODY = 8
+_negated_relations = {"<": ">=", ">": "<=", "==": "!=", "!=": "=="}
+_flipped_relations = {
+    "<": ">",
+    ">": "<",
+    "<=": ">=",
+    ">=": "<=",
+    "==": "==",
+    "!=": "!=",
+}
+
+
+def _loop_iterations(start: int, step: int, relation: str, value: int) -> Optional[int]:
+    """Count the iterations of a do-while loop over a counter
+
+    The counter is incremented by step (1 or -1) at the start of each
+    iteration, and the loop continues while `counter <relation> value` holds.
+    Produces None if the loop would never end.
+
+    """
+    if step < 0:
+        # flip everything around, so the counter is incrementing
+        start, value, relation = -start, -value, _flipped_relations[relation]
+    match relation:
+        case "!=":
+            n = value - start
+        case "==":
+            n = 2 if start + 1 == value else 1
+        case "<":
+            n = max(1, value - start)
+        case "<=":
+            n = max(1, value - start + 1)
+        case ">":
+            n = 0 if start + 1 > value else 1
+        case _:  # ">="
+            n = 0 if start + 1 >= value else 1
+    return n if n >= 1 else None
+
+
+class CompilingCPU(CPU):
+    """Intcode CPU that compiles straight-line blocks of code to Python functions
+
+    A block runs up to the first jump or halt, and each block is compiled the
+    first time it is executed. The base opcodes are translated to Python
+    expressions directly; other plain instructions (such as the I/O hooks
+    produced by ioset()) are called, but only as the first instruction in a
+    block so that an exception raised by a hook leaves the CPU position at
+    that instruction. Any other instruction types are left to the interpreter.
+
+    Writes to compiled code invalidate the affected blocks, and once modified,
+    addresses are never compiled again but are interpreted instead.
+
+    """
+
+    # memory addresses holding code that has been altered
+    _modified: Set[int]
+
+    def _load(self, memory: Memory, pos: int, registers: Registers) -> None:
+        super()._load(memory, pos, registers)
+        self._modified = set()
+
+    def _invalidate(self, addr: int) -> None:
+        self._modified.add(addr)
+        super()._invalidate(addr)
+
+    def _compilable(self, opcode: int, pos: int) -> Optional[InstructionBase]:
+        """The instruction at pos, provided it can be compiled"""
+        instr = self.opcodes.get(opcode % 100)
+        if instr is None or not (_inlined(opcode, instr) or type(instr) is Instruction):
+            return None
+        modified = self._modified
+        if any(addr in modified for addr in range(pos, pos + instr.length)):
+            return None
+        return instr
+
+    def _decode(self, opcode: int) -> Step:
+        fused = self._fuse_loop(opcode)
+        if fused is not None:
+            return fused
+        if self._compilable(opcode, self.pos) is not None:
+            step, end = self._compile_block()
+            if step is not None:
+                self._cache(opcode, step, end)
+                return step
+        return self._decode_instruction(opcode)
+
+    def _compile_block(self) -> Tuple[Optional[Step], int]:
+        """Compile the code at the current position, up to the end of the block"""
+        mem, start = self.memory, self.pos
+        pos, lines, call = start, [], None
+
+        def operand(mode: ParameterMode, param: int) -> str:
+            if mode is ParameterMode.immediate:
+                return str(param)
+            if mode is ParameterMode.position:
+                return f"m[{param}]"
+            return f"m[rb + {param}]"
+
+        def write(mode: ParameterMode, param: int, value: str, next: int) -> None:
+            if mode is ParameterMode.immediate:
+                lines.append("raise Halt")
+                return
+            target = str(param)
+            if mode is ParameterMode.relative:
+                lines.append(f"t = rb + {param}")
+                target = "t"
+            lines.extend(
+                [
+                    f"m[{target}] = {value}",
+                    # leave the block if this write altered compiled code
+                    f"if {target} in cov:",
+                    f"    inv({target})",
+                    f"    return {next}",
+                ]
+            )
+
+        while True:
+            opcode = mem[pos]
+            instr = self._compilable(opcode, pos)
+            if instr is None:
+                break
+            inlined = _inlined(opcode, instr)
+            if not inlined and pos != start:
+                # calls only ever start a block
+                break
+            try:
+                modes = [
+                    ParameterMode(opcode // 10 ** (i + 2) % 10)
+                    for i in range(instr.arg_count + int(instr.output))
+                ]
+            except ValueError:
+                break
+            params = [mem[addr] for addr in range(pos + 1, pos + instr.length)]
+            args = [operand(mode, p) for mode, p in zip(modes, params)]
+            pos, code = pos + instr.length, opcode % 100
+
+            if not inlined:
+                assert isinstance(instr, Instruction)
+                call = instr.f
+                value = f"call({', '.join(args[: instr.arg_count])})"
+                if instr.output:
+                    write(modes[-1], params[-1], f"int({value})", pos)
+                else:
+                    lines.append(value)
+                if call == Halt.halt:
+                    break
+            elif code in (5, 6):
+                test = _inline_templates[code].format(args[0])
+                lines.append(f"return {args[1]} if {test} else {pos}")
+                break
+            elif code == 9:
+                lines.extend(
+                    [
+                        _inline_templates[code].format(args[0]),
+                        'reg["relative base"] = rb',
+                    ]
+                )
+            else:
+                value = _inline_templates[code].format(*args[: instr.arg_count])
+                write(modes[-1], params[-1], value, pos)
+
+        if pos == start:
+            return None, pos
+        if not lines[-1].startswith(("return", "raise")):
+            lines.append(f"return {pos}")
+        if any("rb" in line for line in lines):
+            lines.insert(0, 'rb = reg["relative base"]')
+        source = "\n".join(
+            [
+                "def factory(m, reg, cov, inv, call, Halt):",
+                f"    def block_{start}():",
+                *(f"        {line}" for line in lines),
+                f"    return block_{start}",
+            ]
+        )
+        namespace: Dict[str, Any] = {}
+        exec(source, namespace)
+        step = namespace["factory"](
+            mem, self.registers, self._covered, self._invalidate, call, Halt
+        )
+        return step, pos
+
+
+# Python expression templates for the base opcodes inlined by CompilingCPU
+_inline_templates: Dict[int, str] = {
+    1: "{} + {}",
+    2: "{} * {}",
+    5: "{}",
+    6: "not {}",
+    7: "int({} < {})",
+    8: "int({} == {})",
+    9: "rb += {}",
+}
+
+
+def _inlined(opcode: int, instr: InstructionBase) -> bool:
+    """Is this one of the base opcodes that CompilingCPU translates directly"""
+    return opcode % 100 in _inline_templates and base_opcodes[opcode % 100] is instr
+
 
 base_opcodes = {
     1: Instruction(operator.add, 2, True),
@@ -301,16 +1286,340 @@ def ioset(
     )
 
 
-if __name__ == "__main__":
+class RunCache:
+    """Outputs of programs that only do input and output, keyed by their inputs
+
+    Results are keyed on a digest of the initial memory plus the inputs, which
+    is only valid for programs whose output is fully determined by those, as
+    is the case for the base opcodes. Up to maxsize results are kept in memory,
+    discarding the least recently used first (no limit if maxsize is None).
+    Given a path, results are also stored in a shelve database there, so they
+    can be shared between sessions.
+
+    """
+
+    def __init__(self, maxsize: Optional[int] = 4096, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._results: OrderedDict[bytes, Tuple[int, ...]] = OrderedDict()
+        self._shelf: Optional[shelve.Shelf[Tuple[int, ...]]] = (
+            shelve.open(path) if path is not None else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __enter__(self) -> RunCache:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._shelf is not None:
+            self._shelf.close()
+            self._shelf = None
+
+    @staticmethod
+    def digest(memory: Union[List[int], Memory]) -> bytes:
+        """Digest of the initial memory of a program"""
+        return hashlib.blake2b(repr(list(memory)).encode()).digest()
+
+    @staticmethod
+    def _key(digest: bytes, inputs: Iterable[int]) -> bytes:
+        inputs_repr = repr([int(i) for i in inputs]).encode()
+        return hashlib.blake2b(inputs_repr, key=digest[:64]).digest()
+
+    def lookup(self, digest: bytes, inputs: Iterable[int]) -> Optional[List[int]]:
+        """Produce the cached outputs for a program digest and inputs, if any"""
+        key = self._key(digest, inputs)
+        outputs = self._results.get(key)
+        if outputs is not None:
+            self._results.move_to_end(key)
+        elif self._shelf is not None:
+            outputs = self._shelf.get(key.hex())
+            if outputs is not None:
+                self._remember(key, outputs)
+        if outputs is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(outputs)
+
+    def store(
+        self, digest: bytes, inputs: Iterable[int], outputs: Iterable[int]
+    ) -> None:
+        """Cache the outputs for a program digest and inputs"""
+        key, outputs = self._key(digest, inputs), tuple(map(int, outputs))
+        self._remember(key, outputs)
+        if self._shelf is not None:
+            self._shelf[key.hex()] = outputs
+
+    def _remember(self, key: bytes, outputs: Tuple[int, ...]) -> None:
+        self._results[key] = outputs
+        self._results.move_to_end(key)
+        if self.maxsize is not None and len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def run(self, memory: Union[List[int], Memory], inputs: Iterable[int]) -> List[int]:
+        """Run a program with the given inputs, or produce the cached outputs"""
+        digest, inputs = self.digest(memory), list(inputs)
+        outputs = self.lookup(digest, inputs)
+        if outputs is None:
+            outputs = run_io(memory, inputs)
+            self.store(digest, inputs, outputs)
+        return outputs
+
+
+def run_io(
+    memory: Union[List[int], Memory],
+    inputs: Iterable[int],
+    cache: Optional[RunCache] = None,
+) -> List[int]:
+    """Run a program to completion with the given inputs, returning its outputs
+
+    With a cache, outputs for memory and inputs seen before are taken from
+    the cache instead.
+
+    """
+    if cache is not None:
+        return cache.run(memory, inputs)
+    outputs, opcodes = ioset(inputs)
+    CPU(opcodes).reset(memory).execute()
+    return outputs
+
+
+def run_patched(
+    memory: Union[List[int], Memory], values: Sequence[int], offset: int = 1
+) -> int:
+    """Run a program with values written to memory at offset, returning memory[0]"""
+    cpu = CPU(base_opcodes).reset(memory)
+    for addr, value in enumerate(values, offset):
+        cpu.memory[addr] = value
+    cpu.execute()
+    return cpu.memory[0]
+
+
+def run_chained(
+    memory: Union[List[int], Memory], settings: Sequence[int], signal: int = 0
+) -> int:
+    """Run copies of a program in a feedback loop, returning the last signal
+
+    Each copy is first given its setting, after which the signal is passed
+    from one copy to the next, until the copies halt. Programs that halt
+    after producing a single output are thus simply run in series.
+
+    """
+    cpus = []
+    for setting in settings:
+        cpu = CPU(base_opcodes).reset(memory).run()
+        next(cpu)  # run until the program asks for its setting
+        cpu.send(setting)
+        cpus.append(cpu)
+
+    halted = False
+    while not halted:
+        for cpu in cpus:
+            signal = cast(int, cpu.send(signal))
+            try:
+                next(cpu)  # continue until the program needs more input
+            except StopIteration:
+                halted = True
+    return signal
+
+
+# per-process state for parallel_search() workers
+_search_memory: Union[List[int], Memory] = []
+_search_evaluate: Callable[[Union[List[int], Memory], Any], Any] = run_io
+
+
+def _init_search_worker(
+    memory: Union[List[int], Memory],
+    evaluate: Callable[[Union[List[int], Memory], Any], Any],
+) -> None:
+    global _search_memory, _search_evaluate
+    _search_memory, _search_evaluate = memory, evaluate
+
+
+def _search_task(candidate: Any) -> Tuple[Any, Any]:
+    return candidate, _search_evaluate(_search_memory, candidate)
+
+
+def parallel_search(
+    memory: Union[List[int], Memory],
+    candidates: Iterable[C],
+    evaluate: Callable[[Union[List[int], Memory], C], R],
+    objective: Callable[[Iterator[Tuple[C, R]]], Any] = partial(max, key=itemgetter(1)),
+    max_workers: Optional[int] = None,
+    chunksize: int = 16,
+) -> Any:
+    """Evaluate candidate inputs for a program across a pool of processes
+
+    The program memory and evaluate callable are sent to each worker process
+    just once, candidates are sent in batches of chunksize. evaluate is called
+    with the memory and a candidate, and must be picklable; use a module-level
+    function such as run_io(), run_patched() or run_chained(), or a partial()
+    of one.
+
+    objective is passed an iterator of (candidate, result) tuples, in candidate
+    order, and its return value is returned. The default produces the tuple
+    with the highest result. Once the objective returns, any candidates not
+    yet evaluated are cancelled, so the objective can stop early.
+
+    """
+    with ProcessPoolExecutor(
+        max_workers,
+        initializer=_init_search_worker,
+        initargs=(memory, evaluate),
+    ) as executor:
+        try:
+            return objective(
+                executor.map(_search_task, candidates, chunksize=chunksize)
+            )
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+class _BatchLanes:
+    """Memory and registers for lanes of a batch, as NumPy arrays"""
+
+    def __init__(self, memory: Union[List[int], Memory], lanes: int) -> None:
+        self.mem = np.tile(np.array(list(memory), dtype=np.int64), (lanes, 1))
+        self.pos, self.rb, self.inptr = (
+            np.zeros(lanes, dtype=np.int64) for _ in range(3)
+        )
+
+    def ensure(self, addresses: npt.NDArray[np.int64]) -> None:
+        """Grow the memory of all lanes to accommodate the addresses"""
+        if addresses.size and addresses.min() < 0:
+            raise IndexError(f"Negative memory address: {addresses.min()}")
+        size, top = self.mem.shape[1], int(addresses.max(initial=-1)) + 1
+        if top > size:
+            self.mem = np.pad(self.mem, ((0, 0), (0, max(top, size * 2) - size)))
+
+    def address(
+        self, lane: npt.NDArray[np.intp], word: npt.NDArray[np.int64], k: int
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.bool_]]:
+        """Addresses for parameter k, and which lanes use immediate mode"""
+        raw = self.mem[lane, self.pos[lane] + 1 + k]
+        mode = word // 10 ** (k + 2) % 10
+        relative = mode == ParameterMode.relative.value
+        addr = np.where(relative, raw + self.rb[lane], raw)
+        return addr, mode == ParameterMode.immediate.value
+
+    def read(
+        self, lane: npt.NDArray[np.intp], word: npt.NDArray[np.int64], k: int
+    ) -> npt.NDArray[np.int64]:
+        addr, immediate = self.address(lane, word, k)
+        addr = np.where(immediate, self.pos[lane] + 1 + k, addr)
+        self.ensure(addr)
+        return self.mem[lane, addr]
+
+    def write(
+        self,
+        lane: npt.NDArray[np.intp],
+        word: npt.NDArray[np.int64],
+        k: int,
+        values: npt.NDArray[Any],
+    ) -> None:
+        addr, immediate = self.address(lane, word, k)
+        if immediate.any():
+            raise ValueError("Immediate mode used for an output parameter")
+        self.ensure(addr)
+        self.mem[lane, addr] = values
+
+
+def execute_batch(
+    memory: Union[List[int], Memory],
+    inputs: npt.ArrayLike,
+    cache: Optional[RunCache] = None,
+) -> List[npt.NDArray[np.int64]]:
+    """Run a copy of the program for each row of inputs, in lockstep
+
+    Memory, positions and relative base registers are stored as NumPy arrays
+    with one lane per copy. Every step executes a single instruction in each
+    lane that hasn't yet halted; the lanes are grouped by opcode and each group
+    is evaluated in one vectorised operation. Only the base opcodes are
+    supported, input is read from the lane's row of inputs, and values are
+    limited to signed 64-bit integers.
+
+    Produces an array of outputs for each lane. With a cache, only the lanes
+    with inputs not seen before are executed.
+
+    """
+    inputs = np.asarray(inputs, dtype=np.int64)
+    assert inputs.ndim == 2, "Inputs must be a 2-D array, one row per lane"
+    if cache is not None:
+        digest, rows = cache.digest(memory), inputs.tolist()
+        results = [cache.lookup(digest, row) for row in rows]
+        missing = [lane for lane, result in enumerate(results) if result is None]
+        if missing:
+            for lane, out in zip(missing, execute_batch(memory, inputs[missing])):
+                found: List[int] = out.tolist()
+                results[lane] = found
+                cache.store(digest, rows[lane], found)
+        return [np.array(out, dtype=np.int64) for out in results]
+    state = _BatchLanes(memory, len(inputs))
+    running = np.ones(len(inputs), dtype=np.bool_)
+    outputs: List[List[int]] = [[] for _ in range(len(inputs))]
+
+    while (active := np.flatnonzero(running)).size:
+        state.ensure(state.pos[active] + 3)
+        words = state.mem[active, state.pos[active]]
+        codes = words % 100
+        for code in np.unique(codes).tolist():
+            selected = codes == code
+            lane, word = active[selected], words[selected]
+            instr = base_opcodes.get(code)
+            if instr is None:
+                raise KeyError(code)
+            nextpos = state.pos[lane] + instr.length
+            match code:
+                case 1 | 2 | 7 | 8:
+                    op = _batch_operators[code]
+                    result = op(state.read(lane, word, 0), state.read(lane, word, 1))
+                    state.write(lane, word, 2, result.astype(np.int64))
+                case 3:
+                    if (state.inptr[lane] >= inputs.shape[1]).any():
+                        raise IndexError("Lane input exhausted")
+                    state.write(lane, word, 0, inputs[lane, state.inptr[lane]])
+                    state.inptr[lane] += 1
+                case 4:
+                    values = state.read(lane, word, 0).tolist()
+                    for ln, value in zip(lane.tolist(), values):
+                        outputs[ln].append(value)
+                case 5 | 6:
+                    test = state.read(lane, word, 0).astype(np.bool_)
+                    target = state.read(lane, word, 1)
+                    nextpos = np.where(test if code == 5 else ~test, target, nextpos)
+                case 9:
+                    state.rb[lane] += state.read(lane, word, 0)
+                case 99:
+                    running[lane] = False
+                    nextpos = state.pos[lane]
+            state.pos[lane] = nextpos
+
+    return [np.array(out, dtype=np.int64) for out in outputs]
+
+
+_batch_operators: Dict[int, Callable[..., npt.NDArray[Any]]] = {
+    1: np.add,
+    2: np.multiply,
+    7: np.less,
+    8: np.equal,
+}
+
+
+def _self_test(cpu_type: Type[CPU]) -> None:
     test_mem = [1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50]
-    cpu = CPU(base_opcodes)
+    cpu = cpu_type(base_opcodes)
     cpu.reset(test_mem).execute()
     assert cpu.memory[0] == 3500
 
     def test_jumpcodes(instr: List[int], tests: Mapping[int, int]) -> None:
         for inp, expected in tests.items():
             outputs, test_opcodes = ioset(inp)
-            CPU(test_opcodes).reset(instr).execute()
+            cpu_type(test_opcodes).reset(instr).execute()
             assert outputs == [expected]
 
     test_tests = (
@@ -380,7 +1689,7 @@ if __name__ == "__main__":
         test_jumpcodes(*test)
 
     outputs, test_opcodes = ioset()
-    cpu = CPU(test_opcodes)
+    cpu = cpu_type(test_opcodes)
 
     quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
     cpu.reset(quine).execute()
@@ -398,3 +1707,214 @@ if __name__ == "__main__":
     large_num_2 = [104, 1125899906842624, 99]
     cpu.reset(large_num_2).execute()
     assert outputs[-1] == large_num_2[1]
+
+    # values that don't fit in 64 bits, and addresses far beyond the program
+    large_num_3 = [1102, 2**40, 2**40, 7, 4, 7, 99, 0]
+    cpu.reset(large_num_3).execute()
+    assert outputs[-1] == 2**80
+    far_address = [1101, 17, 25, 10**9, 4, 10**9, 4, 10**8, 99]
+    cpu.reset(far_address).execute()
+    assert outputs[-2:] == [42, 0]
+
+    # self-modifying code, altering the parameter of an already-decoded output
+    # instruction before jumping back to it.
+    outputs[:] = []
+    self_modifying = [104, 7, 1005, 20, 16, 1101, 1, 0, 20, 1101, 8, 0, 1]
+    self_modifying += [1105, 1, 0, 99, 0, 0, 0, 0]
+    cpu.reset(self_modifying).execute()
+    assert outputs == [7, 8]
+
+    # snapshots and forks continue independently from the captured state
+    def io_opcodes(inputs: Deque[int], outputs: List[int]) -> InstructionSet:
+        return {
+            **base_opcodes,
+            3: Instruction(inputs.popleft, output=True),
+            4: Instruction(outputs.append, 1),
+        }
+
+    def run_until_input(cpu: CPU) -> None:
+        try:
+            cpu.execute()
+        except IndexError:  # input deque is empty
+            pass
+
+    doubler = [3, 11, 1002, 11, 2, 11, 4, 11, 1105, 1, 0, 0]
+    inputs, outputs = deque([21]), []
+    cpu = cpu_type(io_opcodes(inputs, outputs)).reset(doubler)
+    run_until_input(cpu)
+    snapshot = cpu.snapshot()
+    fork_inputs, fork_outputs = deque([5]), []
+    forked = cpu.fork(io_opcodes(fork_inputs, fork_outputs))
+    inputs.append(100)
+    run_until_input(cpu)
+    run_until_input(forked)
+    assert outputs == [42, 200] and fork_outputs == [10]
+    assert cpu.memory[11] == 200 and forked.memory[11] == 10
+    inputs.append(7)
+    run_until_input(cpu.restore(snapshot))
+    assert outputs[-1] == 14 and snapshot.memory[11] == 42
+
+    # resumable execution, yielding for input and output
+    runner = cpu_type(base_opcodes).reset(doubler).run()
+    assert next(runner) is None
+    assert runner.send(21) == 42
+    assert next(runner) is None
+    assert runner.send(-3) == -6
+    assert list(cpu_type(base_opcodes).reset(quine).run()) == quine
+
+    # counted loops are collapsed into arithmetic, with identical results
+    mul_loop = [1101, 0, 0, 100, 1101, 0, 7, 101, 1101, 0, 6, 102]
+    mul_loop += [1, 100, 101, 100, 1001, 102, -1, 102, 1005, 102, 12, 4, 100, 99]
+    range_loop = [1101, 0, 0, 100, 1101, 0, 0, 101, 1001, 100, 3, 100]
+    range_loop += [1001, 101, 1, 101, 1007, 101, 10, 102, 1005, 102, 8, 4, 100, 99]
+    countdown = [1101, 200000, 0, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    for fuse_loops in (True, False):
+        outputs, test_opcodes = ioset()
+        cpu = cpu_type(test_opcodes)
+        cpu.fuse_loops = fuse_loops
+        for program in (mul_loop, range_loop, [countdown[0], 20, *countdown[2:]]):
+            cpu.reset(program).execute()
+        assert outputs == [42, 30, 0]
+    cpu.fuse_loops = True
+    cpu.reset(countdown).execute()
+    assert outputs[-1] == 0
+
+    # profiling counts every instruction, and finds the quine output loop
+    outputs, test_opcodes = ioset()
+    cpu = cpu_type(test_opcodes).reset(quine)
+    profile = cpu.start_profiling()
+    cpu.execute()
+    assert outputs == quine and cpu.stop_profiling() is profile
+    report = profile.report()
+    assert report["outputs"] == 16 and report["steps"] == 16 * 5 + 1
+    assert report["loops"] == [{"start": 0, "end": 12, "iterations": 15, "steps": 80}]
+    # the same statistics when running as a generator
+    cpu = cpu_type(base_opcodes)
+    profile = cpu.start_profiling()
+    assert list(cpu.reset(quine).run()) == quine and profile.report() == report
+
+
+def _batch_self_test() -> None:
+    # input == 8, input < 8 and cmp(input, 8), per lane
+    is_eight = [3, 3, 1108, -1, 8, 3, 4, 3, 99]
+    outputs = execute_batch(is_eight, [[8], [7], [-8]])
+    assert [out.tolist() for out in outputs] == [[1], [0], [0]]
+    less_than_eight = [3, 9, 7, 9, 10, 9, 4, 9, 99, -1, 8]
+    outputs = execute_batch(less_than_eight, [[7], [8]])
+    assert [out.tolist() for out in outputs] == [[1], [0]]
+    cmp = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31]
+    cmp += [1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104]
+    cmp += [999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    outputs = execute_batch(cmp, [[7], [8], [42]])
+    assert [out.tolist() for out in outputs] == [[999], [1000], [1001]]
+    # relative mode and memory growth, lanes without input
+    quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+    (output,) = execute_batch(quine, np.empty((1, 0)))
+    assert output.tolist() == quine
+
+
+def _search_self_test() -> None:
+    cmp = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31]
+    cmp += [1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104]
+    cmp += [999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    assert parallel_search(cmp, [(7,), (42,), (8,)], run_io) == ((42,), [1001])
+    # amplifiers in series, and in a feedback loop
+    amplifier = [3, 15, 3, 16, 1002, 16, 10, 16, 1, 16, 15, 15, 4, 15, 99, 0, 0]
+    best = parallel_search(amplifier, permutations(range(5)), run_chained)
+    assert best == ((4, 3, 2, 1, 0), 43210)
+    feedback = [3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27]
+    feedback += [4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0, 5]
+    best = parallel_search(feedback, permutations(range(5, 10)), run_chained)
+    assert best == ((9, 8, 7, 6, 5), 139629729)
+    # an objective that stops at the first match
+    add = [1, 0, 0, 0, 99]
+    found = parallel_search(
+        add,
+        product(range(5), repeat=2),
+        run_patched,
+        objective=lambda results: next(c for c, r in results if r == 100),
+    )
+    assert found == (0, 4)
+
+
+def _cache_self_test() -> None:
+    cmp = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31]
+    cmp += [1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104]
+    cmp += [999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    cache = RunCache(maxsize=2)
+    assert run_io(cmp, [7], cache=cache) == [999] and cache.misses == 1
+    assert run_io(cmp, [7], cache=cache) == [999] and cache.hits == 1
+    outputs = execute_batch(cmp, [[7], [8], [42]], cache=cache)
+    assert [out.tolist() for out in outputs] == [[999], [1000], [1001]]
+    assert (cache.hits, cache.misses, len(cache)) == (2, 3, 2)
+    # the least recently used result, for input 7, was evicted
+    assert cache.run(cmp, [7]) == [999] and cache.misses == 4
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "runs")
+        with RunCache(path=path) as cache:
+            cache.run(cmp, [7])
+            cache.run([3, 0, 99], [7])
+        with RunCache(path=path) as cache:
+            assert cache.run(cmp, [7]) == [999] and cache.hits == 1
+            # no outputs is a result too, and is kept in memory as well
+            assert cache.run([3, 0, 99], [7]) == [] and cache.hits == 2
+            assert len(cache) == 2
+            # a different program doesn't share results
+            assert cache.run([*cmp[:32], 998, *cmp[33:]], [7]) == [998]
+
+
+def _trace_self_test() -> None:
+    cmp = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31]
+    cmp += [1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104]
+    cmp += [999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    # echo input, minus 1, until the input is 0
+    echo = [3, 100, 1006, 100, 14, 1001, 100, -1, 100, 4, 100, 1105, 1, 0, 99]
+    for program, inputs in ((cmp, [42]), (echo, [5, -(2**70), 1, 0])):
+        outputs, opcodes = ioset(inputs)
+        cpu = CPU(opcodes).reset(program)
+        trace = cpu.start_recording()
+        cpu.execute()
+        assert cpu.stop_recording() is trace and cpu.profile is None
+        assert trace.inputs == inputs and trace.outputs == outputs
+        assert trace.events[0] == (1, Trace.INPUT, inputs[0])
+
+        # the same trace when running as a generator
+        cpu = CPU(base_opcodes).reset(program)
+        recorded = cpu.start_recording()
+        runner, queued = cpu.run(), iter(inputs)
+        try:
+            value = next(runner)
+            while True:
+                value = runner.send(next(queued)) if value is None else next(runner)
+        except StopIteration:
+            pass
+        assert cpu.stop_recording() is recorded
+        assert recorded.events == trace.events and recorded.steps == trace.steps
+
+        fp = BytesIO()
+        trace.dump(fp)
+        fp.seek(0)
+        loaded = Trace.load(fp)
+        assert loaded.events == trace.events and loaded.steps == trace.steps
+        assert list(loaded.start.memory) == program
+        for cpu_type in (CPU, CompilingCPU):
+            loaded.replay(cpu_type)
+        loaded.replay(check_steps=True)
+
+    loaded.events[-1] = (*loaded.events[-1][:2], 17)
+    try:
+        loaded.replay()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Replay accepted a different output")
+
+
+if __name__ == "__main__":
+    for cpu_type in (CPU, CompilingCPU):
+        _self_test(cpu_type)
+    _batch_self_test()
+    _search_self_test()
+    _cache_self_test()
+    _trace_self_test()
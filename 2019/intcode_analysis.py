@@ -0,0 +1,380 @@
+"""Static analysis of Intcode programs
+
+Disassembles a program by following its control flow from the entry points,
+without executing it, and groups the instructions found into basic blocks
+joined into a control-flow graph. Writes that target decoded code
+(self-modifying code) and instructions that depend on the relative base are
+flagged, so a compiler can tell which regions are safe to translate ahead of
+time.
+
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from intcode import (
+    AdjustRelativeBaseInstruction,
+    Halt,
+    Instruction,
+    InstructionBase,
+    InstructionSet,
+    JumpInstruction,
+    Memory,
+    ParameterMode,
+    base_opcodes,
+)
+
+MNEMONICS = {
+    1: "add",
+    2: "mul",
+    3: "in",
+    4: "out",
+    5: "jnz",
+    6: "jz",
+    7: "lt",
+    8: "eq",
+    9: "arb",
+    99: "hlt",
+}
+_PARAMETER_FORMATS = {
+    ParameterMode.position: "[{}]",
+    ParameterMode.immediate: "{}",
+    ParameterMode.relative: "[rb{:+d}]",
+}
+
+
+@dataclass(frozen=True)
+class Operation:
+    """A single decoded instruction"""
+
+    addr: int
+    opcode: int
+    instruction: InstructionBase
+    modes: Tuple[ParameterMode, ...]
+    params: Tuple[int, ...]
+
+    @property
+    def end(self) -> int:
+        """Address just past the instruction and its parameters"""
+        return self.addr + self.instruction.length
+
+    @property
+    def is_halt(self) -> bool:
+        instr = self.instruction
+        return isinstance(instr, Instruction) and instr.f == Halt.halt
+
+    @property
+    def is_jump(self) -> bool:
+        return isinstance(self.instruction, JumpInstruction)
+
+    @property
+    def uses_relative_base(self) -> bool:
+        return isinstance(self.instruction, AdjustRelativeBaseInstruction) or (
+            ParameterMode.relative in self.modes
+        )
+
+    @property
+    def jump_target(self) -> Optional[int]:
+        """The jump target, if it is an immediate value"""
+        if self.is_jump and self.modes[-1] is ParameterMode.immediate:
+            return self.params[-1]
+        return None
+
+    @property
+    def always_jumps(self) -> Optional[bool]:
+        """Whether or not a jump with an immediate test is taken, if known"""
+        if not self.is_jump or self.modes[0] is not ParameterMode.immediate:
+            return None
+        instr = self.instruction
+        assert isinstance(instr, JumpInstruction)
+        return bool(instr.f(self.params[0]))
+
+    @property
+    def write_target(self) -> Optional[Tuple[ParameterMode, int]]:
+        """The parameter mode and parameter for the output, if any"""
+        if not self.instruction.output:
+            return None
+        return self.modes[-1], self.params[-1]
+
+    def successors(self) -> List[int]:
+        """Statically known addresses execution can continue at"""
+        if self.is_halt:
+            return []
+        if not self.is_jump:
+            return [self.end]
+        target, taken = self.jump_target, self.always_jumps
+        targets = [] if taken is False or target is None else [target]
+        if not taken:
+            targets.append(self.end)
+        return targets
+
+    def __str__(self) -> str:
+        name = MNEMONICS.get(self.opcode, f"op{self.opcode}")
+        params = ", ".join(
+            _PARAMETER_FORMATS[mode].format(p)
+            for mode, p in zip(self.modes, self.params)
+        )
+        return f"{self.addr:>5}: {name:<4}{params}".rstrip()
+
+
+@dataclass
+class Block:
+    """A basic block; a run of instructions that is always executed in full"""
+
+    start: int
+    operations: List[Operation] = field(default_factory=list)
+    # statically known successor blocks
+    successors: List[int] = field(default_factory=list)
+    # blocks that can continue into this block
+    predecessors: List[int] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        return self.operations[-1].end
+
+    @property
+    def indirect(self) -> bool:
+        """The block ends in a jump to a target only known at runtime"""
+        last = self.operations[-1]
+        return (
+            last.is_jump and last.jump_target is None and last.always_jumps is not False
+        )
+
+    def __str__(self) -> str:
+        return "\n".join(map(str, self.operations))
+
+
+@dataclass
+class Analysis:
+    """The result of statically analysing an Intcode program"""
+
+    operations: Dict[int, Operation]
+    blocks: Dict[int, Block]
+    # (writing instruction address, target address) pairs, for writes with a
+    # statically known target that lands on decoded code.
+    self_modifying: List[Tuple[int, int]]
+    # addresses of instructions that adjust or use the relative base
+    relative: Set[int]
+    # addresses where decoding failed; an invalid opcode or parameter mode
+    invalid: Set[int]
+
+    @property
+    def indirect_jumps(self) -> List[int]:
+        """Addresses of jumps with a target only known at runtime"""
+        return [
+            addr
+            for addr, op in self.operations.items()
+            if op.is_jump and op.jump_target is None
+        ]
+
+    @property
+    def jump_table(self) -> Dict[int, int]:
+        """Jump instruction addresses mapped to their static targets"""
+        return {
+            addr: target
+            for addr, op in self.operations.items()
+            if (target := op.jump_target) is not None
+        }
+
+    def block_at(self, addr: int) -> Optional[Block]:
+        """The block containing the instruction at addr"""
+        for block in self.blocks.values():
+            if block.start <= addr < block.end and any(
+                op.addr == addr for op in block.operations
+            ):
+                return block
+        return None
+
+    def safe_blocks(self) -> List[Block]:
+        """Blocks that can be translated ahead of time
+
+        These blocks are not the target of self-modifying writes. Because
+        writes in relative mode (or with a target that is itself modified) can
+        land anywhere, this is only a guarantee for programs that don't write
+        in relative mode.
+
+        """
+        modified = {target for _, target in self.self_modifying}
+        return [
+            block
+            for block in self.blocks.values()
+            if not any(
+                op.addr <= t < op.end for op in block.operations for t in modified
+            )
+        ]
+
+    def __str__(self) -> str:
+        return "\n\n".join(
+            f"; block {block.start}"
+            + (f" <- {block.predecessors}" if block.predecessors else "")
+            + f"\n{block}"
+            for block in self.blocks.values()
+        )
+
+
+def decode(
+    memory: Union[List[int], Memory], addr: int, opcodes: InstructionSet = base_opcodes
+) -> Optional[Operation]:
+    """Decode the instruction at addr, or produce None if it is not valid"""
+    if not 0 <= addr < len(memory):
+        return None
+    word = memory[addr]
+    opcode = word % 100
+    instr = opcodes.get(opcode)
+    if word < 0 or instr is None:
+        return None
+    paramcount = instr.arg_count + int(instr.output)
+    if addr + paramcount >= len(memory):
+        return None
+    try:
+        modes = tuple(
+            ParameterMode(word // 10 ** (i + 2) % 10) for i in range(paramcount)
+        )
+    except ValueError:
+        return None
+    if instr.output and modes[-1] is ParameterMode.immediate:
+        return None
+    params = tuple(memory[addr + 1 + i] for i in range(paramcount))
+    return Operation(addr, opcode, instr, modes, params)
+
+
+def _code_pointers(op: Operation) -> Iterator[int]:
+    # Intcode compilers store return addresses by adding an immediate value to
+    # an immediate 0 (or multiplying by 1), and later jump there indirectly.
+    if op.opcode not in (1, 2) or op.modes[:2] != (ParameterMode.immediate,) * 2:
+        return
+    a, b = op.params[:2]
+    neutral = 0 if op.opcode == 1 else 1
+    if a == neutral:
+        yield b
+    if b == neutral:
+        yield a
+
+
+def disassemble(
+    memory: Union[List[int], Memory],
+    entries: Iterable[int] = (0,),
+    opcodes: InstructionSet = base_opcodes,
+    follow_pointers: bool = True,
+) -> Dict[int, Operation]:
+    """Decode all instructions reachable from the entry points
+
+    Execution is followed through fall-through and immediate jump targets.
+    With follow_pointers set, constants stored the way compiled Intcode stores
+    return addresses are also followed, if they decode as an instruction.
+
+    """
+    operations: Dict[int, Operation] = {}
+    pending = list(entries)
+    while pending:
+        addr = pending.pop()
+        while addr not in operations:
+            op = decode(memory, addr, opcodes)
+            if op is None:
+                break
+            operations[addr] = op
+            if follow_pointers:
+                pending += (p for p in _code_pointers(op) if decode(memory, p, opcodes))
+            *branches, addr = op.successors() or [addr]
+            pending += branches
+    return operations
+
+
+def analyse(
+    memory: Union[List[int], Memory],
+    entries: Iterable[int] = (0,),
+    opcodes: InstructionSet = base_opcodes,
+    follow_pointers: bool = True,
+) -> Analysis:
+    """Disassemble a program and build its control-flow graph"""
+    entries = list(entries)
+    operations = disassemble(memory, entries, opcodes, follow_pointers)
+    invalid = {
+        succ
+        for op in operations.values()
+        for succ in op.successors()
+        if succ not in operations
+    }
+    invalid.update(e for e in entries if e not in operations)
+
+    # leaders start a basic block: entry points, jump targets, the instruction
+    # after a jump, and instructions not reached by falling through.
+    fallthrough = {op.end for op in operations.values() if not op.is_jump}
+    leaders = {addr for addr in entries if addr in operations}
+    for addr, op in operations.items():
+        if addr not in fallthrough:
+            leaders.add(addr)
+        if op.is_jump:
+            leaders.update(s for s in op.successors() if s in operations)
+
+    blocks: Dict[int, Block] = {}
+    for start in sorted(leaders):
+        block = blocks[start] = Block(start)
+        addr = start
+        while True:
+            op = operations[addr]
+            block.operations.append(op)
+            if (
+                op.is_jump
+                or op.is_halt
+                or op.end in leaders
+                or op.end not in operations
+            ):
+                break
+            addr = op.end
+        block.successors = [s for s in op.successors() if s in operations]
+    for block in blocks.values():
+        for succ in block.successors:
+            blocks[succ].predecessors.append(block.start)
+
+    # a decoded address covers an instruction's opcode and its parameters
+    covered = {a: op.addr for op in operations.values() for a in range(op.addr, op.end)}
+    self_modifying = [
+        (addr, target[1])
+        for addr, op in operations.items()
+        if (target := op.write_target) is not None
+        and target[0] is ParameterMode.position
+        and target[1] in covered
+    ]
+    relative = {addr for addr, op in operations.items() if op.uses_relative_base}
+    return Analysis(operations, blocks, self_modifying, relative, invalid)
+
+
+if __name__ == "__main__":
+    # compare input with 8, with three branches meeting at a shared output block
+    cmp = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31]
+    cmp += [1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104]
+    cmp += [999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    analysis = analyse(cmp)
+    assert sorted(analysis.blocks) == [0, 9, 16, 22, 31, 36, 46]
+    assert analysis.blocks[0].successors == [22, 9]
+    assert analysis.blocks[16].successors == [36]
+    assert sorted(analysis.blocks[46].predecessors) == [22, 31, 36]
+    assert analysis.jump_table == {6: 22, 13: 31, 16: 36, 28: 46, 33: 46, 42: 46}
+    assert not analysis.self_modifying and not analysis.relative
+    assert not analysis.indirect_jumps and not analysis.invalid
+    assert str(analysis.operations[2]) == "    2: eq  [21], 8, [20]"
+    assert len(analysis.safe_blocks()) == len(analysis.blocks)
+
+    # self-modifying code: 1 + 1 is written over the halt at address 6
+    selfmod = [1101, 1, 1, 6, 4, 5, 99]
+    analysis = analyse(selfmod)
+    assert analysis.self_modifying == [(0, 6)]
+    assert analysis.safe_blocks() == []
+
+    # a call and return through the relative base; the return address is
+    # stored with add 0 + 9 and the subroutine returns with an indirect jump
+    call = [109, 20, 21101, 0, 9, 0, 1105, 1, 10, 99, 204, 1, 2106, 0, 0]
+    analysis = analyse(call)
+    assert analysis.relative == {0, 2, 10, 12}
+    assert analysis.indirect_jumps == [12]
+    assert analysis.blocks[10].indirect
+    assert 9 in analysis.operations and analysis.operations[9].is_halt
+    assert 9 not in analyse(call, follow_pointers=False).operations
+
+    # a quine; data is interpreted in place
+    quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+    analysis = analyse(quine)
+    assert list(analysis.blocks) == [0, 15]
+    assert analysis.blocks[0].successors == [0, 15]
@@ -0,0 +1 @@
+"""Shared code for Advent of Code solutions across the years"""
@@ -0,0 +1,157 @@
+"""Bit-packed cellular automata on bounded 2D grids
+
+A board is a single integer, with a bit per cell, row by row. Each row is
+followed by an always-clear padding bit, so shifting the board by one
+position left or right moves cells onto padding, never onto the next or
+previous row. The whole board is then moved in a given direction by a single
+shift, and Python's arbitrary-precision integers handle boards of any size.
+
+Neighbour counts are computed for all cells at once by adding the shifted
+boards with bitwise half adders. The count for each cell is then spread out
+over a list of bit planes; plane i holds bit i of the count for every cell.
+
+Boards are plain integers and so hashable; adventofcode.cycles.advance() can
+jump ahead once a board repeats.
+
+"""
+from __future__ import annotations
+
+from functools import reduce
+from operator import or_
+from typing import Iterable, Iterator, Sequence
+
+# (dx, dy) offsets of the neighbours that are counted
+MOORE = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+VON_NEUMANN = ((0, -1), (-1, 0), (1, 0), (0, 1))
+# axial hex coordinates, with the q axis along rows and r down the columns
+HEX = ((0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1))
+
+
+class BitGrid:
+    """The shape of a bit-packed board, and operations on boards"""
+
+    __slots__ = ("width", "height", "stride", "mask")
+
+    width: int
+    height: int
+    # bits per row, including the padding bit
+    stride: int
+    # all cell bits set, padding bits clear
+    mask: int
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width, self.height = width, height
+        self.stride = width + 1
+        self.mask = sum(((1 << width) - 1) << y * self.stride for y in range(height))
+
+    def pack(self, rows: Iterable[Iterable[bool]]) -> int:
+        """Create a board from rows of cell values"""
+        board = 0
+        for y, row in enumerate(rows):
+            for x, value in enumerate(row):
+                if value:
+                    board |= 1 << (y * self.stride + x)
+        return board
+
+    def pack_lines(self, lines: Iterable[str], chars: str = "#") -> int:
+        """Create a board from lines of text, setting cells that are in chars"""
+        return self.pack(((c in chars for c in line) for line in lines))
+
+    def rows(self, board: int) -> Iterator[list[bool]]:
+        for y in range(self.height):
+            row = board >> y * self.stride
+            yield [bool(row >> x & 1) for x in range(self.width)]
+
+    def to_lines(self, board: int, on: str = "#", off: str = ".") -> list[str]:
+        return ["".join([on if c else off for c in row]) for row in self.rows(board)]
+
+    def shift(self, board: int, dx: int, dy: int) -> int:
+        """Move the board so each cell holds the value of the cell at +dx, +dy"""
+        offset = dy * self.stride + dx
+        moved = board >> offset if offset >= 0 else board << -offset
+        return moved & self.mask
+
+    def counts(
+        self, board: int, neighbourhood: Sequence[tuple[int, int]] = MOORE
+    ) -> list[int]:
+        """Neighbour counts for all cells, as bit planes (least significant first)"""
+        planes: list[int] = []
+        for dx, dy in neighbourhood:
+            carry = self.shift(board, dx, dy)
+            for i, plane in enumerate(planes):
+                planes[i], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            else:
+                if carry:
+                    planes.append(carry)
+        return planes
+
+    def equal(self, planes: Sequence[int], n: int) -> int:
+        """The cells for which the count equals n"""
+        if n >> len(planes):
+            return 0
+        cells = self.mask
+        for i, plane in enumerate(planes):
+            cells &= plane if n >> i & 1 else ~plane
+        return cells
+
+    def at_least(self, planes: Sequence[int], n: int) -> int:
+        """The cells for which the count is at least n"""
+        if n <= 1:
+            # any count bit set, or all cells
+            return reduce(or_, planes, 0) if n == 1 else self.mask
+        cells = 0
+        for count in range(n, 1 << len(planes)):
+            cells |= self.equal(planes, count)
+        return cells
+
+    def life(
+        self,
+        board: int,
+        born: Iterable[int] = (3,),
+        survive: Iterable[int] = (2, 3),
+        neighbourhood: Sequence[tuple[int, int]] = MOORE,
+    ) -> int:
+        """Step a Life-like automaton with the given birth and survival counts"""
+        planes = self.counts(board, neighbourhood)
+        born_cells = survive_cells = 0
+        for n in born:
+            born_cells |= self.equal(planes, n)
+        for n in survive:
+            survive_cells |= self.equal(planes, n)
+        return (born_cells & ~board | survive_cells & board) & self.mask
+
+
+if __name__ == "__main__":
+    from adventofcode.cycles import advance
+
+    grid = BitGrid(5, 5)
+    blinker = grid.pack_lines([".....", ".....", ".###.", ".....", "....."])
+    assert grid.to_lines(grid.life(blinker))[1:4] == ["..#..", "..#..", "..#.."]
+    assert grid.life(grid.life(blinker)) == blinker
+
+    # a glider moves one cell diagonally every 4 generations, until it hits
+    # the edge and turns into a block.
+    glider = grid.pack_lines([".#...", "..#..", "###..", ".....", "....."])
+    moved = advance(glider, 4, grid.life)
+    assert moved == grid.shift(glider, -1, -1)
+    block = [".....", ".....", ".....", "...##", "...##"]
+    assert grid.to_lines(advance(glider, 10**9, grid.life)) == block
+
+    # neighbour counts in a corner and on a full board
+    full = grid.mask
+    planes = grid.counts(full)
+    assert grid.equal(planes, 3) == grid.pack_lines(
+        ["#...#", ".....", ".....", ".....", "#...#"]
+    )
+    assert grid.at_least(planes, 8) == grid.pack_lines(
+        [".....", ".###.", ".###.", ".###.", "....."]
+    )
+    assert grid.equal(grid.counts(full, VON_NEUMANN), 4).bit_count() == 9
+    assert grid.at_least(grid.counts(blinker), 1).bit_count() == 15
+    assert grid.equal(grid.counts(full, HEX), 6).bit_count() == 9
+
+    # a period-2 oscillator alternates between states after a billion steps
+    assert advance(blinker, 10**9, grid.life) == blinker
+    assert advance(blinker, 10**9 + 1, grid.life) == grid.life(blinker)
@@ -0,0 +1,199 @@
+"""Cycle detection for sequences of states
+
+Plenty of puzzles ask for the state after a huge number of steps, which is
+only reachable because the states start repeating at some point. Rather than
+keep every state seen, the functions here remember a 64-bit fingerprint per
+step (a BLAKE2 digest of the repr() of the state, or of a key derived from
+it), so memory use doesn't depend on how large a single state is. That
+requires equal states to have equal representations, as is the case for
+numbers, strings and tuples of those; turn sets into sorted tuples first.
+
+Unlike hash(), which maps integers that differ by a multiple of 2**61 - 1 to
+the same value, the digest makes collisions vanishingly unlikely, but they
+remain possible. Pass verify=True to confirm a repetition by comparing real
+states over an extra lap of the cycle before trusting it.
+
+Where states can be recomputed cheaply from the start, brent() finds the
+cycle without remembering any history at all.
+
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Callable, Generic, Hashable, Iterable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def _fingerprint(value: Hashable) -> bytes:
+    """64-bit digest of the repr() of a value"""
+    return hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+
+
+class Cycle(NamedTuple):
+    """States repeat every length steps, from step start onwards"""
+
+    start: int
+    length: int
+
+
+class CycleDetector(Generic[T]):
+    """Spots a repetition in a sequence of states, one state at a time
+
+    Only the fingerprint of each state is stored. With verify set, a
+    repetition is only reported once the state a full lap later is equal to
+    the state at which the repetition was spotted; start is then that step,
+    which may be later than the first step of the cycle.
+
+    """
+
+    def __init__(
+        self, key: Optional[Callable[[T], Hashable]] = None, verify: bool = False
+    ) -> None:
+        self.key, self.verify = key, verify
+        self._seen: dict[bytes, int] = {}
+        self._index = -1
+        # the state at which a repetition was spotted, and the cycle, to verify
+        self._candidate: Optional[tuple[T, Cycle]] = None
+
+    def add(self, state: T) -> Optional[Cycle]:
+        """Add the next state; produces the cycle once it is found"""
+        self._index = index = self._index + 1
+        if (candidate := self._candidate) is not None:
+            expected, cycle = candidate
+            if index < cycle.start + cycle.length:
+                return None
+            if state == expected:
+                return cycle
+            # a fingerprint collision, carry on looking
+            self._candidate = None
+        digest = _fingerprint(state if self.key is None else self.key(state))
+        previous = self._seen.get(digest)
+        self._seen[digest] = index
+        if previous is None:
+            return None
+        if not self.verify:
+            return Cycle(previous, index - previous)
+        self._candidate = state, Cycle(index, index - previous)
+        return None
+
+
+def find_cycle(
+    states: Iterable[T],
+    key: Optional[Callable[[T], Hashable]] = None,
+    verify: bool = False,
+) -> Cycle:
+    """Find the first repetition in a sequence of states
+
+    key, if given, produces the hashable part of each state that decides if
+    states are the same. Raises ValueError if the states run out first.
+
+    """
+    detector: CycleDetector[T] = CycleDetector(key, verify)
+    for state in states:
+        if (cycle := detector.add(state)) is not None:
+            return cycle
+    raise ValueError("No cycle found")
+
+
+def advance(
+    state: T,
+    steps: int,
+    step: Callable[[T], T],
+    key: Optional[Callable[[T], Hashable]] = None,
+    verify: bool = False,
+) -> T:
+    """Apply step to state a number of times, fast-forwarding once states repeat
+
+    step must produce a new state rather than alter the state passed in.
+
+    """
+    detector: CycleDetector[T] = CycleDetector(key, verify)
+    for done in range(steps):
+        if (cycle := detector.add(state)) is not None:
+            # state is the same as it was a whole number of cycles ago
+            for _ in range((steps - done) % cycle.length):
+                state = step(state)
+            return state
+        state = step(state)
+    return state
+
+
+def brent(state: T, step: Callable[[T], T]) -> Cycle:
+    """Find the cycle of repeatedly applying step to state, in constant memory
+
+    Uses Brent's algorithm, which only keeps two states around and compares
+    them for equality, but recomputes states from the start to find where
+    the cycle begins. step must produce a new state rather than alter the
+    state passed in.
+
+    """
+    # find the cycle length, with the tortoise teleporting to the hare at
+    # increasing powers of two.
+    power = length = 1
+    tortoise, hare = state, step(state)
+    while tortoise != hare:
+        if power == length:
+            tortoise, power, length = hare, power * 2, 0
+        hare = step(hare)
+        length += 1
+
+    # then find the start, with the hare a cycle length ahead of the tortoise
+    tortoise = hare = state
+    for _ in range(length):
+        hare = step(hare)
+    start = 0
+    while tortoise != hare:
+        tortoise, hare = step(tortoise), step(hare)
+        start += 1
+    return Cycle(start, length)
+
+
+if __name__ == "__main__":
+    from typing import Iterator
+
+    # a rho-shaped sequence: 3 steps lead into a cycle of 5 states
+    def rho(n: int) -> int:
+        return n + 1 if n < 7 else 3
+
+    assert brent(0, rho) == Cycle(3, 5)
+    assert find_cycle([0, 1, 2, 3, 4, 5, 6, 7, 3, 4]) == Cycle(3, 5)
+    for steps in range(40):
+        expected = 0
+        for _ in range(steps):
+            expected = rho(expected)
+        assert advance(0, steps, rho) == expected
+        assert advance(0, steps, rho, verify=True) == expected
+
+    # verification catches fingerprint collisions; this key makes states 1
+    # and 5 look the same.
+    def colliding(n: int) -> int:
+        return 1 if n == 5 else n
+
+    def rho_states() -> Iterator[int]:
+        n = 0
+        while True:
+            yield n
+            n = rho(n)
+
+    assert find_cycle(rho_states(), key=colliding) == Cycle(1, 4)
+    assert find_cycle(rho_states(), key=colliding, verify=True) == Cycle(9, 5)
+    for steps in range(40):
+        expected = 0
+        for _ in range(steps):
+            expected = rho(expected)
+        assert advance(0, steps, rho, key=colliding, verify=True) == expected
+
+    # integers that hash() considers the same are told apart
+    wide = 1 << 61
+    assert hash(1) == hash(wide)
+    assert find_cycle([1, wide, 5, 1]) == Cycle(0, 3)
+    jumps = {0: wide, wide: 1, 1: 2, 2: 3, 3: 4, 4: 2}
+    assert advance(0, 10, jumps.__getitem__) == 3
+
+    try:
+        find_cycle(range(10))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("find_cycle found a cycle in a finite sequence")
@@ -0,0 +1,183 @@
+"""Flat grid of byte values, for map-based puzzles
+
+Cells are stored row by row in a single bytearray, surrounded by a border of
+sentinel cells, so stepping off the edge of the map lands on a border cell
+rather than outside the buffer. A cell is addressed by a single integer
+index, and the neighbouring cell in a compass direction is found by adding a
+fixed offset to that index. Search states can hold a plain int as their
+position, and moving around the map allocates no tuples or other objects.
+
+Only one border column is needed; the border cell at the end of each row
+doubles as the western neighbour of the first cell on the next row.
+
+"""
+from __future__ import annotations
+
+from typing import Final, Iterable, Iterator, NamedTuple, Optional, Sequence, Union
+
+# the value of cells on the border around the map
+BORDER: Final = 0xFF
+# translation table to turn ASCII digits into their integer value
+DIGITS: Final = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+class Route(NamedTuple):
+    """The shortest route between two cells"""
+
+    steps: int
+    # bitmask of the gates passed; bit i is set for the value at gates[i]
+    gates: int = 0
+
+
+class Grid:
+    """A rectangular map of byte values, addressed by integer cell indices"""
+
+    __slots__ = ("cells", "width", "height", "stride", "offsets")
+
+    cells: bytearray
+    width: int
+    height: int
+    # index distance between vertically adjacent cells
+    stride: int
+    # index offsets to the north, east, south and west neighbours
+    offsets: tuple[int, int, int, int]
+
+    def __init__(self, rows: Iterable[bytes]) -> None:
+        rows = list(rows)
+        self.width = width = len(rows[0])
+        self.height = len(rows)
+        self.stride = stride = width + 1
+        border = bytes([BORDER])
+        cells = bytearray(border * stride)
+        for row in rows:
+            if len(row) != width:
+                raise ValueError("All rows must have the same length")
+            cells += row
+            cells += border
+        cells += border * stride
+        self.cells = cells
+        self.offsets = (-stride, 1, stride, -1)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], table: Optional[bytes] = None) -> Grid:
+        """Create a grid from lines of text, optionally translating bytes"""
+        rows = (line.encode() for line in lines)
+        if table is not None:
+            rows = (row.translate(table) for row in rows)
+        return cls(rows)
+
+    def __getitem__(self, index: int) -> int:
+        return self.cells[index]
+
+    def __str__(self) -> str:
+        return "\n".join(row.decode() for row in self.rows())
+
+    def index(self, x: int, y: int) -> int:
+        """The cell index for a given x, y position"""
+        return (y + 1) * self.stride + x
+
+    def pos(self, index: int) -> tuple[int, int]:
+        """The x, y position of a cell index"""
+        y, x = divmod(index, self.stride)
+        return x, y - 1
+
+    def indices(self) -> Iterator[int]:
+        """The indices of all cells on the map, row by row"""
+        stride, width = self.stride, self.width
+        for start in range(stride, stride * (self.height + 1), stride):
+            yield from range(start, start + width)
+
+    def rows(self) -> Iterator[bytes]:
+        stride, width, cells = self.stride, self.width, self.cells
+        for start in range(stride, stride * (self.height + 1), stride):
+            yield bytes(cells[start : start + width])
+
+    def neighbours(self, index: int) -> Iterator[int]:
+        """The indices of the cells adjacent to index, border cells excluded"""
+        cells = self.cells
+        for offset in self.offsets:
+            if cells[index + offset] != BORDER:
+                yield index + offset
+
+    def distance(self, a: int, b: int) -> int:
+        """The manhattan distance between two cells"""
+        (ay, ax), (by, bx) = divmod(a, self.stride), divmod(b, self.stride)
+        return abs(ax - bx) + abs(ay - by)
+
+    def find(self, value: Union[int, bytes]) -> int:
+        """The index of the first cell with the given value"""
+        return self.cells.index(value)
+
+    def distances(
+        self, points: Sequence[int], walls: bytes = b"#", gates: bytes = b""
+    ) -> list[list[Optional[Route]]]:
+        """Shortest routes between all pairs of points
+
+        One breadth-first flood fill per point, through cells that are not
+        walls, fills a row of the matrix; unreachable points are None. Cells
+        with a value in gates can be passed, but are recorded in the gates
+        bitmask for the route, so routes that need a key to open a door can
+        be told apart.
+
+        """
+        cells, offsets = self.cells, self.offsets
+        blocked = {BORDER, *walls}
+        gate_bits = {gate: 1 << i for i, gate in enumerate(gates)}
+        targets = {point: i for i, point in enumerate(points)}
+        matrix: list[list[Optional[Route]]] = []
+        for start in points:
+            row: list[Optional[Route]] = [None] * len(points)
+            # gate bitmask for the route to each cell seen
+            passed = {start: 0}
+            frontier, steps = [start], 0
+            while frontier:
+                new_frontier: list[int] = []
+                for pos in frontier:
+                    if (target := targets.get(pos)) is not None:
+                        row[target] = Route(steps, passed[pos])
+                    mask = passed[pos]
+                    for offset in offsets:
+                        new = pos + offset
+                        if new in passed or (value := cells[new]) in blocked:
+                            continue
+                        passed[new] = mask | gate_bits.get(value, 0)
+                        new_frontier.append(new)
+                frontier, steps = new_frontier, steps + 1
+            matrix.append(row)
+        return matrix
+
+
+if __name__ == "__main__":
+    grid = Grid.from_lines(["123", "456"], DIGITS)
+    assert (grid.width, grid.height, grid.stride) == (3, 2, 4)
+    assert [grid[i] for i in grid.indices()] == [1, 2, 3, 4, 5, 6]
+    assert grid[grid.index(2, 1)] == 6 and grid.pos(grid.index(2, 1)) == (2, 1)
+    assert grid.find(5) == grid.index(1, 1)
+    # the corner only has two neighbours, walking off any edge hits the border
+    assert sorted(grid.neighbours(grid.index(0, 0))) == [
+        grid.index(1, 0),
+        grid.index(0, 1),
+    ]
+    assert len(list(grid.neighbours(grid.index(1, 1)))) == 3
+    for i in grid.indices():
+        for offset in grid.offsets:
+            walk = i + offset
+            while grid[walk] != BORDER:
+                walk += offset
+            assert 0 <= walk < len(grid.cells)
+    assert grid.distance(grid.index(0, 0), grid.index(2, 1)) == 3
+    assert str(Grid.from_lines(["#.", ".#"])) == "#.\n.#"
+
+    maze = Grid.from_lines(["#######", "#a.A.b#", "#.###B#", "#.c...#", "#######"])
+    a, b, c = (maze.find(key) for key in b"abc")
+    routes = maze.distances([a, b, c], gates=b"AB")
+    assert routes[0] == [Route(0), Route(4, 0b01), Route(3)]
+    assert routes[1][2] == Route(5, 0b10) and routes[2][1] == routes[1][2]
+    walled = Grid.from_lines(["a#b"])
+    assert walled.distances([walled.find(b"a"), walled.find(b"b")])[0][1] is None
+    try:
+        Grid([b"ab", b"c"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Grid accepted rows of unequal length")
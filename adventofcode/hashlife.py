@@ -0,0 +1,371 @@
+"""HashLife: memoised quadtree stepping for cellular automata on infinite grids
+
+The plane is a quadtree of nodes; a node at level k covers 2^k by 2^k cells
+and has 4 children of level k - 1, and the level 0 leaves are plain cell
+states. Nodes are canonicalised, so identical regions anywhere in space or
+time are the same object, and comparing two regions is an identity check.
+
+The core operation produces the centre half of a node, advanced 2^j
+generations, for any j up to k - 2. Because the result only depends on the
+node, it is memoised, and repeating patterns (empty space, oscillators,
+gliders) are calculated once no matter how often or where they occur. That
+makes it practical to advance some patterns billions of generations in one
+call.
+
+Cells take integer states, with one background state (0 by default) filling
+the infinite plane. Any rule that decides the next state of a cell from its
+3x3 neighbourhood can be used, as long as background cells surrounded by
+background stay background. Rules with a larger radius can be used by
+grouping cells into blocks, so the radius drops back down to 1.
+
+"""
+from __future__ import annotations
+
+from typing import Callable, Iterable, Iterator, Mapping, NamedTuple, Optional
+
+# the next state of a cell given its 3x3 neighbourhood, row by row
+Rule = Callable[[tuple[int, ...]], int]
+
+
+class Node:
+    """A square region of 2^level by 2^level cells
+
+    Level 0 nodes are single cells, with a state; other nodes have 4 children.
+    Don't create these directly, use HashLife.node() and HashLife.leaf() so
+    nodes stay canonical.
+
+    """
+
+    __slots__ = ("level", "state", "empty", "nw", "ne", "sw", "se")
+
+    level: int
+    # the cell state, for level 0 nodes
+    state: int
+    # all cells are in the background state
+    empty: bool
+    nw: Node
+    ne: Node
+    sw: Node
+    se: Node
+
+    def __init__(self, level: int, empty: bool, state: int = 0) -> None:
+        self.level, self.empty, self.state = level, empty, state
+
+
+class Period(NamedTuple):
+    """A repeating pattern
+
+    The pattern first seen at generation start reappears every length
+    generations, moved by dx, dy cells.
+
+    """
+
+    start: int
+    length: int
+    dx: int
+    dy: int
+
+
+class HashLife:
+    """An infinite grid of cells, stepped with a 3x3 neighbourhood rule"""
+
+    root: Node
+    # x, y position of the north-west corner of the root node
+    origin: tuple[int, int]
+    generation: int
+
+    def __init__(self, rule: Rule, background: int = 0) -> None:
+        if rule((background,) * 9) != background:
+            raise ValueError("The rule must leave empty space empty")
+        self.rule, self.background = rule, background
+        self._nodes: dict[tuple[Node, Node, Node, Node], Node] = {}
+        self._leaves: dict[int, Node] = {}
+        self._empty: list[Node] = []
+        self._results: dict[tuple[Node, int], Node] = {}
+        self.root, self.origin, self.generation = self.empty(3), (0, 0), 0
+
+    def leaf(self, state: int) -> Node:
+        """The canonical single-cell node for a state"""
+        if (node := self._leaves.get(state)) is None:
+            node = self._leaves[state] = Node(0, state == self.background, state)
+        return node
+
+    def node(self, nw: Node, ne: Node, sw: Node, se: Node) -> Node:
+        """The canonical node with the given children"""
+        key = (nw, ne, sw, se)
+        if (node := self._nodes.get(key)) is None:
+            empty = nw.empty and ne.empty and sw.empty and se.empty
+            node = self._nodes[key] = Node(nw.level + 1, empty)
+            node.nw, node.ne, node.sw, node.se = key
+        return node
+
+    def empty(self, level: int) -> Node:
+        """The node of the given level with only background cells"""
+        empty = self._empty
+        if not empty:
+            empty.append(self.leaf(self.background))
+        while len(empty) <= level:
+            e = empty[-1]
+            empty.append(self.node(e, e, e, e))
+        return empty[level]
+
+    def load(self, cells: Mapping[tuple[int, int], int]) -> None:
+        """Replace the grid contents with the given x, y -> state mapping"""
+        positions = [pos for pos, state in cells.items() if state != self.background]
+        if not positions:
+            self.root, self.origin = self.empty(3), (0, 0)
+            return
+        minx, miny = (min(c) for c in zip(*positions))
+        span = max(max(x - minx, y - miny) for x, y in positions) + 1
+        level = max(3, (span - 1).bit_length())
+        bg = self.background
+
+        def build(level: int, x: int, y: int) -> Node:
+            if not level:
+                return self.leaf(cells.get((x, y), bg))
+            half = 1 << (level - 1)
+            return self.node(
+                build(level - 1, x, y),
+                build(level - 1, x + half, y),
+                build(level - 1, x, y + half),
+                build(level - 1, x + half, y + half),
+            )
+
+        self.root = build(level, minx, miny)
+        self.origin = (minx, miny)
+
+    def cells(self) -> Iterator[tuple[int, int, int]]:
+        """All x, y, state triplets for cells not in the background state"""
+        stack = [(self.root, *self.origin)]
+        while stack:
+            node, x, y = stack.pop()
+            if node.empty:
+                continue
+            if not node.level:
+                yield x, y, node.state
+                continue
+            half = 1 << (node.level - 1)
+            stack += (
+                (node.se, x + half, y + half),
+                (node.sw, x, y + half),
+                (node.ne, x + half, y),
+                (node.nw, x, y),
+            )
+
+    def _centre(self, node: Node) -> Node:
+        return self.node(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _expand(self) -> None:
+        """Surround the root with empty space, doubling its size"""
+        root, (x, y) = self.root, self.origin
+        e = self.empty(root.level - 1)
+        self.root = self.node(
+            self.node(e, e, e, root.nw),
+            self.node(e, e, root.ne, e),
+            self.node(e, root.sw, e, e),
+            self.node(root.se, e, e, e),
+        )
+        quarter = 1 << (root.level - 1)
+        self.origin = (x - quarter, y - quarter)
+
+    def _crop(self) -> None:
+        """Drop empty space around the pattern, halving the root size while we can"""
+        while self.root.level > 3:
+            root = self.root
+            nw, ne, sw, se = root.nw, root.ne, root.sw, root.se
+            border = (nw.nw, nw.ne, nw.sw, ne.nw, ne.ne, ne.se)
+            border += (sw.nw, sw.sw, sw.se, se.ne, se.sw, se.se)
+            if not all(node.empty for node in border):
+                break
+            self.root = self._centre(root)
+            quarter = 1 << (root.level - 2)
+            self.origin = (self.origin[0] + quarter, self.origin[1] + quarter)
+
+    def _base(self, node: Node) -> Node:
+        """Advance the centre 2x2 cells of a 4x4 node by one generation"""
+        pairs = ((node.nw, node.ne), (node.sw, node.se))
+        grid = [
+            [c.state for q in pair for c in ((q.nw, q.ne) if top else (q.sw, q.se))]
+            for pair in pairs
+            for top in (True, False)
+        ]
+        rule, leaf = self.rule, self.leaf
+        cells = [
+            leaf(
+                rule(
+                    tuple(s for row in grid[y - 1 : y + 2] for s in row[x - 1 : x + 2])
+                )
+            )
+            for y, x in ((1, 1), (1, 2), (2, 1), (2, 2))
+        ]
+        return self.node(*cells)
+
+    def _result(self, node: Node, j: int) -> Node:
+        """The centre of node, advanced 2^j generations (j <= node.level - 2)"""
+        key = (node, j)
+        if (result := self._results.get(key)) is not None:
+            return result
+        level = node.level
+        if node.empty:
+            result = self.empty(level - 1)
+        elif level == 2:
+            result = self._base(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            node_ = self.node
+            # 9 overlapping sub-squares of half the size, in a 3x3 layout
+            squares = [
+                nw,
+                node_(nw.ne, ne.nw, nw.se, ne.sw),
+                ne,
+                node_(nw.sw, nw.se, sw.nw, sw.ne),
+                self._centre(node),
+                node_(ne.sw, ne.se, se.nw, se.ne),
+                sw,
+                node_(sw.ne, se.nw, sw.se, se.sw),
+                se,
+            ]
+            if j == level - 2:
+                # two half steps: first advance the 9 squares, then the 4 quadrants
+                # they make up when combined.
+                c = [self._result(sq, level - 3) for sq in squares]
+                quadrants = [
+                    node_(c[i], c[i + 1], c[i + 3], c[i + 4]) for i in (0, 1, 3, 4)
+                ]
+                result = node_(*(self._result(q, level - 3) for q in quadrants))
+            else:
+                # a smaller step: advance the 9 squares, then take the centre of
+                # the 4 quadrants without stepping further.
+                c = [self._result(sq, j) for sq in squares]
+                result = node_(
+                    *(
+                        self._centre(node_(c[i], c[i + 1], c[i + 3], c[i + 4]))
+                        for i in (0, 1, 3, 4)
+                    )
+                )
+        self._results[key] = result
+        return result
+
+    def step(self, k: int = 0) -> None:
+        """Advance the grid 2^k generations"""
+        self._crop()
+        # the pattern spreads at most one cell per generation; make sure the
+        # result, the centre half of the root, has room for that.
+        self._expand()
+        self._expand()
+        while self.root.level < k + 3:
+            self._expand()
+        level = self.root.level
+        self.root = self._result(self.root, k)
+        quarter = 1 << (level - 2)
+        self.origin = (self.origin[0] + quarter, self.origin[1] + quarter)
+        self.generation += 1 << k
+
+    def run(self, generations: int) -> None:
+        """Advance the grid the given number of generations"""
+        for k in range(generations.bit_length()):
+            if generations >> k & 1:
+                self.step(k)
+
+    def normalised(self) -> tuple[int, int, tuple[tuple[int, int, int], ...]]:
+        """The pattern relative to its top-left corner, and that corner's position"""
+        cells = sorted(self.cells(), key=lambda c: (c[1], c[0]))
+        if not cells:
+            return 0, 0, ()
+        minx = min(x for x, _, _ in cells)
+        miny = cells[0][1]
+        return minx, miny, tuple((x - minx, y - miny, s) for x, y, s in cells)
+
+    def find_period(self, limit: int) -> Optional[Period]:
+        """Step one generation at a time until the pattern repeats
+
+        A pattern counts as repeated when the same cells reappear, even if
+        moved; the generation at the end is where the repetition was found.
+        Gives up and produces None after limit generations.
+
+        """
+        seen: dict[tuple[tuple[int, int, int], ...], tuple[int, int, int]] = {}
+        for _ in range(limit + 1):
+            x, y, pattern = self.normalised()
+            if (previous := seen.get(pattern)) is not None:
+                start, px, py = previous
+                return Period(start, self.generation - start, x - px, y - py)
+            seen[pattern] = self.generation, x, y
+            self.step()
+        return None
+
+    @classmethod
+    def from_lines(
+        cls, rule: Rule, lines: Iterable[str], states: Mapping[str, int]
+    ) -> HashLife:
+        """Create a grid from lines of text, mapping characters to states"""
+        life = cls(rule)
+        life.load(
+            {
+                (x, y): states[c]
+                for y, line in enumerate(lines)
+                for x, c in enumerate(line)
+            }
+        )
+        return life
+
+
+def life_rule(born: Iterable[int] = (3,), survive: Iterable[int] = (2, 3)) -> Rule:
+    """A rule for Life-like two-state automata, with a Moore neighbourhood"""
+    born_counts, survive_counts = frozenset(born), frozenset(survive)
+
+    def rule(cells: tuple[int, ...]) -> int:
+        count = sum(cells) - cells[4]
+        return int(count in (survive_counts if cells[4] else born_counts))
+
+    return rule
+
+
+if __name__ == "__main__":
+    from random import Random
+
+    from adventofcode.automaton import BitGrid
+
+    conway = life_rule()
+    glider = HashLife.from_lines(conway, [".#.", "..#", "###"], {".": 0, "#": 1})
+    assert glider.find_period(10) == Period(0, 4, 1, 1)
+    glider.run(1 << 40)
+    assert glider.generation == 4 + (1 << 40)
+    x, y, pattern = glider.normalised()
+    assert (x, y) == (1 + (1 << 38), 1 + (1 << 38))
+    assert (
+        pattern
+        == HashLife.from_lines(
+            conway, [".#.", "..#", "###"], {".": 0, "#": 1}
+        ).normalised()[2]
+    )
+
+    blinker = HashLife.from_lines(conway, ["###"], {"#": 1})
+    blinker.step(5)
+    assert blinker.find_period(5) == Period(32, 2, 0, 0)
+
+    # compare against the bit-packed engine on a random soup
+    rnd = Random(42)
+    soup = [[rnd.random() < 0.4 for _ in range(20)] for _ in range(20)]
+    grid = BitGrid(200, 200)
+    board = grid.pack([[]] * 90 + [[False] * 90 + row for row in soup])
+    hl = HashLife(conway)
+    hl.load({(x, y): 1 for y, row in enumerate(soup) for x, c in enumerate(row) if c})
+    for generations in (1, 2, 5, 16, 40):
+        for _ in range(generations):
+            board = grid.life(board)
+        hl.run(generations)
+        expected = {
+            (x - 90, y - 90)
+            for y, row in enumerate(grid.rows(board))
+            for x, c in enumerate(row)
+            if c
+        }
+        assert {(x, y) for x, y, _ in hl.cells()} == expected
+
+    try:
+        HashLife(life_rule(born=(0,)))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("HashLife accepted a rule that fills empty space")
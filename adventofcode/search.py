@@ -0,0 +1,310 @@
+"""Priority queue and A* / Dijkstra search, shared by the path-finding puzzles
+
+Search states are hashable objects that compare equal when they represent the
+same node in the search graph; the cost of the path taken to reach a state
+is not part of its identity. Callers plug in how to generate next states, and
+what the path cost and estimated total cost for a state are.
+
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from heapq import heapify, heappop, heappush
+from typing import (
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    Protocol,
+    TypeVar,
+    cast,
+)
+
+T = TypeVar("T")
+S = TypeVar("S", bound=Hashable)
+
+# Heap entries are single integers, priority << _SEQ_BITS | sequence number,
+# the sequence number indexing the list of queued items. Integers compare
+# much faster than (priority, count, item) tuples, and there is no tuple to
+# allocate per entry. Equal priorities are served first in, first out.
+_SEQ_BITS = 40
+_SEQ_MASK = (1 << _SEQ_BITS) - 1
+# renumber the queued items once the slots of items already produced
+# outnumber those still queued by more than this.
+_COMPACT_SLACK = 1024
+
+
+class PriorityQueue(Generic[T]):
+    """Queue producing the item with the lowest integer priority first"""
+
+    def __init__(self, *initial: tuple[int, T]) -> None:
+        self._items: list[Optional[T]] = [item for _, item in initial]
+        self._queue = [pri << _SEQ_BITS | i for i, (pri, _) in enumerate(initial)]
+        heapify(self._queue)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(self, pri: int, item: T) -> None:
+        items = self._items
+        heappush(self._queue, pri << _SEQ_BITS | len(items))
+        items.append(item)
+
+    def get(self) -> T:
+        queue, items = self._queue, self._items
+        if not queue:
+            raise ValueError("Queue is empty")
+        seq = heappop(queue) & _SEQ_MASK
+        item, items[seq] = items[seq], None
+        if len(items) > 2 * len(queue) + _COMPACT_SLACK:
+            self._compact()
+        return cast(T, item)
+
+    def _compact(self) -> None:
+        """Renumber the queued items, dropping the slots of items produced
+
+        Sequence numbers keep their relative order, so entries compare as
+        before and the heap stays valid with every entry updated in place.
+
+        """
+        queue, items = self._queue, self._items
+        order = sorted(range(len(queue)), key=lambda i: queue[i] & _SEQ_MASK)
+        compacted: list[Optional[T]] = []
+        for seq, i in enumerate(order):
+            compacted.append(items[queue[i] & _SEQ_MASK])
+            queue[i] = queue[i] & ~_SEQ_MASK | seq
+        self._items = compacted
+
+
+class BucketQueue(Generic[T]):
+    """Queue for small, non-negative integer priorities, lowest first
+
+    Items are kept in a bucket (list) per priority, with a cursor for the
+    lowest bucket that can hold items. Putting an item is O(1), and so is
+    getting one, amortised, as long as priorities never drop far below the
+    priority of the last item produced. That holds for Dijkstra's algorithm
+    with small integer edge costs (Dial's algorithm), and for A* with a
+    consistent heuristic. Items with equal priority are produced last in,
+    first out.
+
+    """
+
+    def __init__(self, *initial: tuple[int, T]) -> None:
+        self._buckets: list[list[T]] = []
+        self._lowest = self._size = 0
+        for pri, item in initial:
+            self.put(pri, item)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put(self, pri: int, item: T) -> None:
+        buckets = self._buckets
+        if pri >= len(buckets):
+            buckets.extend([] for _ in range(pri - len(buckets) + 1))
+        elif pri < self._lowest:
+            if pri < 0:
+                raise ValueError("Priorities must not be negative")
+            self._lowest = pri
+        buckets[pri].append(item)
+        self._size += 1
+
+    def get(self) -> T:
+        if not self._size:
+            raise ValueError("Queue is empty")
+        buckets, lowest = self._buckets, self._lowest
+        while not buckets[lowest]:
+            lowest += 1
+        self._lowest = lowest
+        self._size -= 1
+        return buckets[lowest].pop()
+
+
+@dataclass
+class SearchStats:
+    """Counters for the work done by a search
+
+    Pass an instance to a search to have it filled in; compare the numbers
+    before and after a pruning or heuristic change to judge its effect.
+
+    """
+
+    # states taken from the queue to generate next states from
+    expanded: int = 0
+    # states added to the queue
+    pushed: int = 0
+    # next states discarded without being queued
+    pruned: int = 0
+    # states taken from the queue that a cheaper path had superseded
+    stale: int = 0
+    peak_queue: int = 0
+    # peak number of states tracked as seen or with a best cost
+    peak_closed: int = 0
+    # the heuristic estimate at the start, and the true cost of the result
+    estimate: Optional[int] = None
+    cost: Optional[int] = None
+
+    @property
+    def heuristic_ratio(self) -> Optional[float]:
+        """Ratio of the initial estimate to the true cost
+
+        An admissible estimate for a cost-minimising search gives a ratio of at
+        most 1.0, an upper bound for a maximising search a ratio of at least
+        1.0. The closer to 1.0, the better the estimate guides the search.
+
+        """
+        if self.estimate is None or not self.cost:
+            return None
+        return self.estimate / self.cost
+
+    def __str__(self) -> str:
+        ratio = self.heuristic_ratio
+        return (
+            f"expanded {self.expanded}, pushed {self.pushed}, "
+            f"pruned {self.pruned}, stale {self.stale}, "
+            f"peak queue {self.peak_queue}, peak closed {self.peak_closed}, "
+            f"heuristic ratio {'n/a' if ratio is None else f'{ratio:.3f}'}"
+        )
+
+
+class Queue(Protocol[T]):
+    def __len__(self) -> int:
+        ...
+
+    def put(self, pri: int, item: T) -> None:
+        ...
+
+    def get(self) -> T:
+        ...
+
+
+def astar(
+    starts: Iterable[S],
+    is_goal: Callable[[S], bool],
+    moves: Callable[[S], Iterable[S]],
+    cost: Callable[[S], int],
+    heuristic: Optional[Callable[[S], int]] = None,
+    queue_type: Callable[[], Queue[S]] = PriorityQueue,
+    stats: Optional[SearchStats] = None,
+) -> Optional[S]:
+    """Find the cheapest path from any of the start states to a goal state
+
+    - moves produces the next states reachable from a given state
+    - cost produces the (integer) cost of the path taken to reach a state
+    - heuristic produces the priority of a state: the path cost so far plus
+      an estimate of the remaining cost that must not overestimate. Without a
+      heuristic the path cost is used, making this Dijkstra's algorithm.
+    - queue_type creates the priority queue; pass in BucketQueue when costs
+      are small non-negative integers.
+    - stats, if given, is updated with counters for the work done. The
+      estimate recorded is the lowest priority among the start states.
+
+    Produces the first goal state reached, or None if no goal is reachable.
+
+    Rather than track open and closed sets, a single map records the best
+    cost found for each state. States popped from the queue with a higher cost
+    were superseded by a cheaper path, and are skipped (lazy deletion).
+
+    """
+    priority = cost if heuristic is None else heuristic
+    best: dict[S, int] = {}
+    queue = queue_type()
+    put, get = queue.put, queue.get
+    for state in starts:
+        best[state] = cost(state)
+        put(priority(state), state)
+    if stats is not None:
+        stats.pushed += len(queue)
+        stats.peak_queue = max(stats.peak_queue, len(queue))
+        stats.estimate = min(map(priority, best), default=None)
+
+    found: Optional[S] = None
+    while queue:
+        current = get()
+        if best[current] < cost(current):
+            # a cheaper path to this state was found after it was queued
+            if stats is not None:
+                stats.stale += 1
+            continue
+        if is_goal(current):
+            found = current
+            break
+
+        pushed = len(queue)
+        for neighbor in moves(current):
+            neighbor_cost = cost(neighbor)
+            known = best.get(neighbor)
+            if known is not None and known <= neighbor_cost:
+                # not a cheaper path than we already have
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+            best[neighbor] = neighbor_cost
+            put(priority(neighbor), neighbor)
+        if stats is not None:
+            stats.expanded += 1
+            stats.pushed += len(queue) - pushed
+            stats.peak_queue = max(stats.peak_queue, len(queue))
+
+    if stats is not None:
+        # the best cost map only ever grows
+        stats.peak_closed = max(stats.peak_closed, len(best))
+        stats.cost = None if found is None else cost(found)
+    return found
+
+
+if __name__ == "__main__":
+    queue = PriorityQueue((3, "c"), (1, "a"), (-5, "first"))
+    queue.put(1, "b")
+    assert [queue.get() for _ in range(len(queue))] == ["first", "a", "b", "c"]
+    # slots for items already produced are reclaimed, keeping the order
+    numbers: PriorityQueue[int] = PriorityQueue()
+    for i in range(10_000):
+        numbers.put(i % 7, i)
+        if i % 3:
+            numbers.get()
+    assert len(numbers._items) <= 2 * len(numbers) + _COMPACT_SLACK
+    drained = [numbers.get() for _ in range(len(numbers))]
+    keys = [(i % 7, i) for i in drained]
+    assert keys == sorted(keys)
+    buckets = BucketQueue((3, "c"), (1, "a"), (5, "e"))
+    buckets.put(0, "first")
+    assert [buckets.get(), buckets.get()] == ["first", "a"]
+    buckets.put(2, "b")
+    assert [buckets.get() for _ in range(len(buckets))] == ["b", "c", "e"]
+
+    # a weighted graph; the direct edge to the goal is not the cheapest path
+    graph = {"a": {"b": 1, "d": 10}, "b": {"c": 2}, "c": {"d": 3}, "d": {}}
+
+    @dataclass(frozen=True)
+    class Node:
+        name: str
+        steps: int = field(compare=False, default=0)
+
+        def moves(self) -> Iterable[Node]:
+            for name, weight in graph[self.name].items():
+                yield Node(name, self.steps + weight)
+
+    def steps(node: Node) -> int:
+        return node.steps
+
+    for queue_type in (PriorityQueue, BucketQueue):
+        found = astar(
+            [Node("a")], lambda n: n.name == "d", Node.moves, steps, None, queue_type
+        )
+        assert found is not None and found.steps == 6
+    assert astar([Node("d")], lambda n: n.name == "a", Node.moves, steps) is None
+
+    # a, b and c are expanded and d is queued twice, via a and via c. The goal
+    # is reached before the costlier entry for d comes up.
+    stats = SearchStats()
+    astar([Node("a")], lambda n: n.name == "d", Node.moves, steps, stats=stats)
+    assert (stats.expanded, stats.pushed, stats.stale) == (3, 5, 0)
+    assert (stats.peak_queue, stats.peak_closed, stats.cost) == (2, 4, 6)
+    assert stats.heuristic_ratio == 0.0
+    # with a goal costlier than both paths to d, the entry via a goes stale
+    stats = SearchStats()
+    graph["c"]["e"] = 8
+    astar([Node("a")], lambda n: n.name == "e", Node.moves, steps, stats=stats)
+    assert (stats.expanded, stats.stale, stats.cost) == (4, 1, 11)
@@ -0,0 +1,149 @@
+"""Held-Karp dynamic programming solver for travelling salesman problems
+
+Rather than try every ordering of n nodes (O(n!)), the Held-Karp algorithm
+records the best cost of a path that visits a given subset of the nodes and
+ends at a given node, building up from single nodes to the full set. Subsets
+are bitmasks, so the table has 2^n rows of n columns, and filling it takes
+O(2^n n^2) time. That makes 15 or so nodes practical, where permutations
+give up after 10.
+
+The table is either a list of lists, or, for larger inputs, a NumPy array
+filled one subset size at a time with vectorised operations.
+
+"""
+from __future__ import annotations
+
+from math import inf
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import numpy.typing as npt
+
+Table = Union[list[list[float]], npt.NDArray[np.float64]]
+
+
+def _table_lists(distances: Sequence[Sequence[float]], starts: list[int]) -> Table:
+    n = len(distances)
+    required = (1 << starts[0]) if len(starts) == 1 else 0
+    table = [[inf] * n for _ in range(1 << n)]
+    for start in starts:
+        table[1 << start][start] = 0
+    for mask in range(3, 1 << n):
+        if not mask & (mask - 1) or mask & required != required:
+            # single-node subsets are starting points, the rest are unreachable
+            continue
+        row = table[mask]
+        members = [k for k in range(n) if mask >> k & 1]
+        for k in members:
+            prev = table[mask ^ (1 << k)]
+            row[k] = min(prev[j] + distances[j][k] for j in members)
+    return table
+
+
+def _table_numpy(distances: Sequence[Sequence[float]], starts: list[int]) -> Table:
+    n = len(distances)
+    dist = np.asarray(distances, dtype=np.float64)
+    table = np.full((1 << n, n), inf)
+    table[np.left_shift(1, starts), starts] = 0
+    masks = np.arange(1 << n)
+    sizes = ((masks[:, None] >> np.arange(n)) & 1).sum(axis=1)
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for k in range(n):
+            subsets = layer[(layer >> k) & 1 == 1]
+            # the ends of paths not including k, extended to k
+            prev = table[subsets ^ (1 << k)]
+            table[subsets, k] = (prev + dist[:, k]).min(axis=1)
+    return table
+
+
+def held_karp(
+    distances: Sequence[Sequence[float]],
+    start: Optional[int] = None,
+    closed: bool = False,
+    maximise: bool = False,
+    use_numpy: bool = False,
+) -> tuple[float, list[int]]:
+    """Find the cheapest route that visits every node exactly once
+
+    - distances[a][b] is the cost of travelling from node a to node b; use
+      math.inf for missing edges.
+    - start fixes the first node of the route; without it, any node can be
+      the first.
+    - closed routes return to the first node at the end. The route produced
+      does not repeat the first node. Because a closed route can be rotated
+      freely, node 0 is the start if none was given.
+    - maximise finds the most expensive route instead.
+    - use_numpy stores the table in a NumPy array, which is faster for larger
+      numbers of nodes.
+
+    Produces the cost and the route, as a list of node indices.
+
+    """
+    n = len(distances)
+    if not n:
+        raise ValueError("Need at least one node")
+    if maximise:
+        # missing edges stay impassable
+        distances = [[d if d == inf else -d for d in row] for row in distances]
+    if closed and start is None:
+        start = 0
+    starts = list(range(n)) if start is None else [start]
+    table = (_table_numpy if use_numpy else _table_lists)(distances, starts)
+
+    full = (1 << n) - 1
+    ends = [
+        table[full][k] + (distances[k][starts[0]] if closed and n > 1 else 0)
+        for k in range(n)
+    ]
+    cost = min(ends)
+    if cost == inf:
+        raise ValueError("No route visits every node")
+
+    # walk back through the table to recover the route
+    k, mask = ends.index(cost), full
+    route = [k]
+    while mask & (mask - 1):
+        prev = table[mask ^ (1 << k)]
+        target = table[mask][k]
+        k, mask = (
+            next(j for j in range(n) if prev[j] + distances[j][k] == target),
+            mask ^ (1 << k),
+        )
+        route.append(k)
+    route.reverse()
+    cost = -cost if maximise else cost
+    return (int(cost) if float(cost).is_integer() else float(cost)), route
+
+
+if __name__ == "__main__":
+    from itertools import permutations, product
+    from random import Random
+
+    def route_cost(route: Sequence[int], closed: bool = False) -> float:
+        if closed and len(route) > 1:
+            route = [*route, route[0]]
+        legs = zip(route, route[1:])
+        return sum(matrix[a][b] for a, b in legs)
+
+    rnd = Random(42)
+    for size in (1, 2, 5, 7):
+        matrix = [[rnd.randrange(1, 100) for _ in range(size)] for _ in range(size)]
+        options = product((False, True), (None, 0, size - 1), (False, True))
+        for (closed, start, maximise), use_numpy in product(options, (False, True)):
+            cost, route = held_karp(matrix, start, closed, maximise, use_numpy)
+            assert sorted(route) == list(range(size))
+            assert start is None or route[0] == start
+            assert route_cost(route, closed) == cost
+            firsts = range(size) if start is None else [start]
+            orders = [p for p in permutations(range(size)) if p[0] in firsts]
+            costs = [route_cost(p, closed) for p in orders]
+            assert cost == (max(costs) if maximise else min(costs))
+            assert isinstance(cost, int)
+
+    try:
+        held_karp([[0, inf], [inf, 0]])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("held_karp found a route that doesn't exist")